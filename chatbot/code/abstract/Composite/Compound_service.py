@@ -1,3 +1,5 @@
+import asyncio
+
 from abstract.Composite.Service import Service
 
 class Compound_service(Service):
@@ -12,17 +14,19 @@ class Compound_service(Service):
         self._services_to_wait = services
 
 
+    def get_services_to_wait(self):
+        return list(self._services_to_wait)
+
+
     async def connect(self):
         """Sobrescribe el método connect para esperar a todos los servicios."""
-        # Conecta todos los servicios primero
-        for service in self._services_to_wait:
-            await service.wait_for_connection()  # Espera a que cada servicio se conecte
+        # Espera en paralelo a que cada dependencia se conecte
+        await asyncio.gather(*(service.wait_for_connection() for service in self._services_to_wait))
 
         await super().connect()
 
     async def wait_for_connection(self):
         """Sobrescribe wait_for_connection para esperar que todos los servicios estén listos."""
-        for service in self._services_to_wait:
-            await service.wait_for_connection()
+        await asyncio.gather(*(service.wait_for_connection() for service in self._services_to_wait))
 
         await super().wait_for_connection()
\ No newline at end of file
@@ -9,12 +9,21 @@ class Service(ABC):
         self._service_name = type(self).__name__
 
     async def connect(self):
-        """Inicia la conexión al servicio si aún no está conectado."""
-        if not self._connected.is_set() and self._connection_task is None:
+        """Inicia la conexión al servicio si aún no está conectado.
+
+        Las llamadas concurrentes esperan a la misma conexión en curso."""
+        if self._connected.is_set():
+            return
+        if self._connection_task is None:
             self._connection_task = asyncio.create_task(self._connect())
             print(f"Iniciando conexión con {self._service_name}...")
-            await self._connection_task
+            try:
+                await self._connection_task
+            finally:
+                self._connection_task = None
             print(f"Conexion a {self._service_name} establecida.")
+        else:
+            await asyncio.shield(self._connection_task)
 
     async def disconnect(self):
         """Desconecta del servicio si está conectado."""
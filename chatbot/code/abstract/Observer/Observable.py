@@ -1,5 +1,7 @@
 from abstract.Observer.Observer import Observer
 
+import asyncio
+
 class Observable:
     
 
@@ -8,17 +10,42 @@ class Observable:
 
     def __init__(self):
         self._observers = []
-        pass
+        self._dependencies = {}
 
 
-    def add_observer(self, observer:Observer):
+    def add_observer(self, observer:Observer, after=()):
+        """Registra un observador que se notifica después de los observadores de 'after'."""
         self._observers.append(observer)
+        self._dependencies[observer] = list(after)
 
 
     def remove_observer(self, observer:Observer):
         self._observers.remove(observer)
+        self._dependencies.pop(observer, None)
+
+
+    def _get_dependencies(self, observer):
+        """Observadores que deben terminar antes: los de 'after' y, si es un servicio
+        compuesto, los servicios que espera."""
+        dependencies = list(self._dependencies.get(observer, []))
+        if hasattr(observer, "get_services_to_wait"):
+            dependencies += observer.get_services_to_wait()
+        return [dependency for dependency in dependencies if dependency in self._observers]
+
+
+    async def notify_observers(self, changes=None):
+        """Notifica a todos los observadores en paralelo; cada uno espera solo a sus dependencias.
+
+        El error de un observador no impide notificar a los demás."""
+        tasks = {}
 
+        async def notify(observer):
+            await asyncio.gather(*(tasks[dependency] for dependency in self._get_dependencies(observer)), return_exceptions=True)
+            await observer.notify(changes)
 
-    async def notify_observers(self):
         for observer in self._observers:
-            await observer.notify()
\ No newline at end of file
+            tasks[observer] = asyncio.create_task(notify(observer))
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for observer, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                print(f"Error al notificar a {type(observer).__name__}: {type(result).__name__} {result}")
\ No newline at end of file
@@ -4,5 +4,6 @@ class Observer(ABC):
 
     
     @abstractmethod
-    async def notify(self):
+    async def notify(self, changes):
+        """Reacciona a un cambio del observable; 'changes' describe qué cambió."""
         pass
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""Benchmarks offline del chatbot.
+
+Uso (desde chatbot/code):
+    python -m benchmarks --suite all --documents 500 --concurrency 1 4 16 --output report.json
+    python -m benchmarks --suite queries --workload queries.jsonl --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+
+from benchmarks.harness import Benchmark, compare, format_report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks offline del chatbot.")
+    parser.add_argument("--suite", choices=["build", "queries", "all"], default="all")
+    parser.add_argument("--workdir", default=None, help="Directorio de trabajo (por defecto, uno temporal).")
+    parser.add_argument("--documents", type=int, default=200, help="Archivos del corpus sintético.")
+    parser.add_argument("--sections", type=int, default=6, help="Secciones por archivo.")
+    parser.add_argument("--mutate-fraction", type=float, default=0.05, help="Fracción de archivos modificados en la prueba incremental.")
+    parser.add_argument("--workload", default=None, help="Archivo JSONL con objetos {'session_id', 'question'}.")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas de la carga generada si no se indica --workload.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    parser.add_argument("--llm-first-token-latency", type=float, default=0.2)
+    parser.add_argument("--llm-token-latency", type=float, default=0.01)
+    parser.add_argument("--llm-answer-tokens", type=int, default=40)
+    parser.add_argument("--embedding-dimensions", type=int, default=384)
+    parser.add_argument("--embedding-call-latency", type=float, default=0.005)
+    parser.add_argument("--embedding-text-latency", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Archivo donde guardar el reporte json.")
+    parser.add_argument("--compare", default=None, help="Reporte json previo contra el cual comparar.")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Variación porcentual tolerada antes de marcar una regresión.")
+    parser.add_argument("--verbose", action="store_true", help="Muestra la salida del chatbot.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    suites = {"build", "queries"} if args.suite == "all" else {args.suite}
+    with tempfile.TemporaryDirectory(prefix="chatbot-bench-") as tmp_dir:
+        args.workdir = args.workdir or tmp_dir
+        report = asyncio.run(Benchmark(args).run(suites))
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        lines, regressions = compare(baseline, report, args.tolerance)
+        print(f"\nComparación contra {baseline.get('commit')}:")
+        print("\n".join(lines))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Generación determinista de una wiki json sintética y de cargas de consultas."""
+
+import json
+import os
+import random
+
+TOPICS = [
+    "instalación", "configuración", "despliegue", "autenticación", "base de datos", "caché",
+    "webhook", "historial", "embeddings", "modelo de lenguaje", "monitoreo", "respaldo",
+    "permisos", "red", "contenedores", "migraciones", "pruebas", "rendimiento"
+]
+
+WORDS = (
+    "el servicio usa un archivo de configuración para definir los parámetros del entorno "
+    "cada petición pasa por la caché antes de consultar el índice vectorial y el modelo "
+    "los documentos se fragmentan por secciones y se embeben en lotes de tamaño fijo "
+    "si el proceso falla se reintenta con espera exponencial y se registra el error "
+    "el administrador puede reiniciar el contenedor sin perder el estado persistido "
+    "las variables sensibles se guardan fuera del repositorio y se cargan al iniciar"
+).split()
+
+QUESTIONS = [
+    "¿Cómo se configura {topic}?",
+    "¿Qué hago si falla {topic}?",
+    "Explica el funcionamiento de {topic}",
+    "¿Dónde se documenta {topic} en la wiki?",
+    "{code}",
+    "error {code} en {topic}"
+]
+
+
+def _paragraph(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _document(rng, index, sections, words):
+    topic = TOPICS[index % len(TOPICS)]
+    return {
+        "title": f"{topic.capitalize()} {index}",
+        "tags": rng.sample(TOPICS, 3),
+        "sections": [
+            {
+                "title": f"{topic.capitalize()} {index}.{section}",
+                "code": f"E-{index}{section:02d}",
+                "content": " ".join(_paragraph(rng, words) for _ in range(rng.randint(1, 4)))
+            }
+            for section in range(sections)
+        ]
+    }
+
+
+def generate_corpus(path, documents, sections=6, words=40, seed=0):
+    """Escribe 'documents' archivos json con secciones de texto y códigos de error."""
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    filenames = []
+    for index in range(documents):
+        filename = f"doc_{index:05d}.json"
+        with open(os.path.join(path, filename), "w", encoding="utf-8") as file:
+            json.dump(_document(rng, index, sections, words), file, ensure_ascii=False, indent=2)
+        filenames.append(filename)
+    return filenames
+
+
+def mutate_corpus(path, fraction, seed=1):
+    """Reescribe una sección de una fracción de los archivos y devuelve los modificados."""
+    rng = random.Random(seed)
+    filenames = sorted(filename for filename in os.listdir(path) if filename.endswith(".json"))
+    modified = rng.sample(filenames, max(1, int(len(filenames) * fraction))) if filenames else []
+    for filename in modified:
+        file_path = os.path.join(path, filename)
+        with open(file_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        section = rng.choice(data["sections"])
+        section["content"] = _paragraph(rng, 60)
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+    return modified
+
+
+def generate_workload(path, queries, documents, sessions=20, seed=0):
+    """Escribe una carga JSONL de consultas con popularidad tipo Zipf, para que haya repeticiones."""
+    rng = random.Random(seed)
+    pool = []
+    for index in range(min(documents, 200)):
+        topic = TOPICS[index % len(TOPICS)]
+        template = QUESTIONS[index % len(QUESTIONS)]
+        pool.append(template.format(topic=f"{topic} {index}", code=f"E-{index}{index % 6:02d}"))
+    weights = [1 / (rank + 1) for rank in range(len(pool))]
+    with open(path, "w", encoding="utf-8") as file:
+        for _ in range(queries):
+            question = rng.choices(pool, weights=weights)[0]
+            file.write(json.dumps({"session_id": f"bench-{rng.randrange(sessions)}", "question": question}, ensure_ascii=False) + "\n")
+
+
+def load_workload(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -0,0 +1,241 @@
+"""Sustitutos locales de Ollama, del modelo de embeddings y de Redis Stack para los benchmarks.
+
+Reproducen solo la interfaz que usa el chatbot y simulan la latencia del servicio real
+con demoras configurables, para medir el resto del sistema sin dependencias externas."""
+
+from fnmatch import fnmatch
+import asyncio
+import hashlib
+import math
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from utils.text_utils import tokenize
+
+
+class Fake_chat_model(BaseChatModel):
+    """Modelo de chat con latencia de primer token y por token configurable."""
+
+    model: str = "fake"
+    temperature: float = 0.0
+    max_tokens: int = 0
+    first_token_latency: float = 0.2
+    token_latency: float = 0.01
+    answer_tokens: int = 40
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _tokens(self, messages):
+        words = tokenize(str(messages[-1].content)) or ["respuesta"]
+        return [words[i % len(words)] for i in range(self.answer_tokens)]
+
+    def _latency(self, tokens):
+        return self.first_token_latency + self.token_latency * max(0, len(tokens) - 1)
+
+    def _result(self, tokens):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(tokens)))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep(self._latency(tokens))
+        return self._result(tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self._latency(tokens))
+        return self._result(tokens)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"{token} "))
+
+
+class Fake_embeddings(Embeddings):
+    """Embeddings deterministas por hashing de términos, con latencia por llamada y por texto.
+
+    Textos con términos en común producen vectores cercanos, por lo que la recuperación
+    y la caché semántica se comportan de forma realista."""
+
+    def __init__(self, dimensions=384, call_latency=0.005, text_latency=0.002):
+        self._dimensions = dimensions
+        self._call_latency = call_latency
+        self._text_latency = text_latency
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.embedded = 0
+
+    def _vector(self, text):
+        vector = [0.0] * self._dimensions
+        for token in tokenize(text):
+            digest = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16)
+            vector[digest % self._dimensions] += 1.0 if (digest >> 64) & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts):
+        time.sleep(self._call_latency + self._text_latency * len(texts))
+        with self._lock:
+            self.calls += 1
+            self.embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+def _redis_slice(items, start, end):
+    """Rango inclusivo con índices negativos, como LRANGE y LTRIM."""
+    return items[start : None if end == -1 else end + 1]
+
+
+class Fake_pipeline:
+    """Pipeline que encola los comandos y los ejecuta en orden en 'execute'."""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return command
+
+    async def execute(self):
+        commands, self._commands = self._commands, []
+        return [await getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+
+class Fake_redis:
+    """Cliente de Redis asíncrono en memoria con los comandos que usa el chatbot."""
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+
+    def _alive(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def pipeline(self, transaction=True):
+        return Fake_pipeline(self)
+
+    async def ping(self):
+        return True
+
+    async def get(self, key):
+        return self._data.get(key) if self._alive(key) else None
+
+    async def set(self, key, value, ex=None):
+        self._data[key] = _encode(value)
+        self._expires.pop(key, None)
+        if ex:
+            await self.expire(key, ex)
+        return True
+
+    async def exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    async def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                deleted += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return deleted
+
+    async def expire(self, key, seconds):
+        if not self._alive(key):
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    async def sadd(self, key, *members):
+        values = self._data[key] if self._alive(key) else self._data.setdefault(key, set())
+        before = len(values)
+        values.update(_encode(member) for member in members)
+        return len(values) - before
+
+    async def smembers(self, key):
+        return set(self._data[key]) if self._alive(key) else set()
+
+    async def rpush(self, key, *values):
+        items = self._data[key] if self._alive(key) else self._data.setdefault(key, [])
+        items.extend(_encode(value) for value in values)
+        return len(items)
+
+    async def lrange(self, key, start, end):
+        return _redis_slice(self._data[key], start, end) if self._alive(key) else []
+
+    async def ltrim(self, key, start, end):
+        if self._alive(key):
+            self._data[key] = _redis_slice(self._data[key], start, end)
+        return True
+
+    async def scan_iter(self, match=None, count=None):
+        for key in list(self._data):
+            if self._alive(key) and (match is None or fnmatch(key, match)):
+                yield key
+
+    async def aclose(self):
+        pass
+
+
+class Fake_semantic_cache:
+    """Caché semántica en memoria con la interfaz de RedisSemanticCache (distancia coseno)."""
+
+    def __init__(self, redis_client=None, embeddings=None, distance_threshold=0.2, ttl=None):
+        self._embeddings = embeddings
+        self._distance_threshold = distance_threshold
+        self._ttl = ttl
+        self._entries = {}  # {llm_string: [(vector, expira, valor)]}
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt, llm_string):
+        vector = self._embeddings.embed_query(prompt)
+        now = time.monotonic()
+        best, best_distance = None, self._distance_threshold
+        with self._lock:
+            for other, expires_at, value in self._entries.get(llm_string, []):
+                if expires_at is not None and expires_at < now:
+                    continue
+                distance = 1 - sum(a * b for a, b in zip(vector, other))
+                if distance <= best_distance:
+                    best, best_distance = value, distance
+        return best
+
+    def update(self, prompt, llm_string, return_val):
+        vector = self._embeddings.embed_query(prompt)
+        expires_at = time.monotonic() + self._ttl if self._ttl else None
+        with self._lock:
+            self._entries.setdefault(llm_string, []).append((vector, expires_at, return_val))
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,267 @@
+"""Ejecuta los benchmarks del chatbot sobre los sustitutos locales y arma el reporte."""
+
+from contextlib import contextmanager, redirect_stdout
+import asyncio
+import io
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.corpus import generate_corpus, generate_workload, load_workload, mutate_corpus
+from benchmarks.fakes import Fake_chat_model, Fake_embeddings, Fake_redis, Fake_semantic_cache
+
+
+def percentile(values, q):
+    """Percentil por el método del rango más cercano."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso y de sus hijos (pool de fragmentación)."""
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": round(own / scale, 1), "children": round(children / scale, 1)}
+
+
+def get_commit():
+    """SHA del commit medido, marcado si el árbol tiene cambios sin commitear."""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd, text=True).strip()
+        return f"{sha}-dirty" if dirty else sha
+    except Exception:
+        return None
+
+
+class Benchmark:
+    """Levanta el chatbot completo con Ollama, embeddings y Redis sustituidos por fakes."""
+
+    def __init__(self, args):
+        self._args = args
+        self._workdir = os.path.abspath(args.workdir)
+        self._corpus_path = os.path.join(self._workdir, "Resources", "wiki")
+        self.embeddings = Fake_embeddings(
+            dimensions=args.embedding_dimensions,
+            call_latency=args.embedding_call_latency,
+            text_latency=args.embedding_text_latency
+        )
+        self.redis = Fake_redis()
+        self.chatbot = None
+
+    @contextmanager
+    def _quiet(self):
+        if self._args.verbose:
+            yield
+        else:
+            with redirect_stdout(io.StringIO()):
+                yield
+
+    def _configure_environment(self):
+        os.makedirs(self._workdir, exist_ok=True)
+        os.chdir(self._workdir)
+        os.environ.update({
+            "RESOURCES_PATH": "Resources",
+            "REPO_NAME": "wiki",
+            "HISTORY_BACKEND": "redis",
+            "REBUILD_GC_DELAY": "0",
+            "INGEST_WORKERS": str(self._args.ingest_workers),
+            "LLM_NAME": "fake",
+            "HISTORY_PROMPT": "Reformula la pregunta usando el historial."
+        })
+
+    def _install_fakes(self):
+        """Reemplaza los clientes externos en los módulos que los crean."""
+        import concrete.LLM_manager as llm_module
+        import concrete.Cache_manager as cache_module
+        import concrete.History_manager as history_module
+        from concrete.Embeddings.Embeddings_factory import Embeddings_factory
+
+        args = self._args
+        llm_module.ChatOllama = lambda **kwargs: Fake_chat_model(
+            **kwargs,
+            first_token_latency=args.llm_first_token_latency,
+            token_latency=args.llm_token_latency,
+            answer_tokens=args.llm_answer_tokens
+        )
+        Embeddings_factory.create = lambda factory: self.embeddings
+        cache_module.get_async_redis = lambda *args: self.redis
+        cache_module.get_sync_redis = lambda *args: None
+        cache_module.RedisSemanticCache = Fake_semantic_cache
+        history_module.get_async_redis = lambda *args: self.redis
+
+    async def setup(self):
+        self._configure_environment()
+        self._install_fakes()
+
+        from concrete.Constants_manager import Constants_manager
+        from concrete.Facade.Chatbot import Chatbot
+
+        generate_corpus(self._corpus_path, self._args.documents, sections=self._args.sections, seed=self._args.seed)
+        Constants_manager()
+        self.chatbot = Chatbot()
+        # El corpus sintético reemplaza al clon del repositorio de GitHub
+        self.chatbot.docs._repo_path = self._corpus_path
+        with self._quiet():
+            await self.chatbot.init_services()
+
+    async def _timed_update(self, name, update):
+        embedded = self.embeddings.embedded
+        start = time.perf_counter()
+        with self._quiet():
+            result = await update()
+        seconds = time.perf_counter() - start
+        chunks = self.chatbot.db._service._collection.count()
+        embedded = self.embeddings.embedded - embedded
+        return {
+            "name": name,
+            "seconds": round(seconds, 3),
+            "chunks": chunks,
+            "embedded": embedded,
+            "embedded_per_second": round(embedded / seconds, 1) if seconds else None,
+            "affected_sources": len(result) if result is not None else None,
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+    async def bench_build(self):
+        """Indexación completa sobre una colección vacía."""
+        return await self._timed_update("cold_build", lambda: asyncio.to_thread(self.chatbot.db.update_vectors))
+
+    async def bench_incremental(self):
+        """Actualización incremental tras modificar una fracción de los archivos."""
+        from utils.aux_classes import DocumentChanges
+
+        modified = mutate_corpus(self._corpus_path, self._args.mutate_fraction, seed=self._args.seed + 1)
+        changes = DocumentChanges(modified=modified)
+        return await self._timed_update("incremental_update", lambda: asyncio.to_thread(self.chatbot.db.update_vectors, changes))
+
+    async def bench_rebuild(self):
+        """Reconstrucción completa en una colección nueva, reutilizando el almacén de vectores."""
+        return await self._timed_update("rebuild", self.chatbot.db.rebuild)
+
+    def _workload(self):
+        if self._args.workload:
+            return load_workload(self._args.workload)
+        path = os.path.join(self._workdir, "workload.jsonl")
+        generate_workload(path, self._args.queries, self._args.documents, seed=self._args.seed)
+        return load_workload(path)
+
+    async def bench_queries(self, concurrency):
+        """Reproduce la carga de consultas con 'concurrency' peticiones simultáneas."""
+        workload = self._workload()
+        with self._quiet():
+            await self.chatbot.cache.clear_cache()
+            await self.chatbot.llm.clear_history()
+        stats_before = self.chatbot.cache.get_stats()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def run(item):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await self.chatbot.chat(item.get("session_id", "bench"), item["question"])
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+
+        start = time.perf_counter()
+        with self._quiet():
+            await asyncio.gather(*(run(item) for item in workload))
+        seconds = time.perf_counter() - start
+
+        stats_after = self.chatbot.cache.get_stats()
+        hits = sum(stats_after[level].get("hits", 0) - stats_before[level].get("hits", 0) for level in ("l1", "l2"))
+        return {
+            "name": f"queries_c{concurrency}",
+            "concurrency": concurrency,
+            "requests": len(workload),
+            "errors": errors,
+            "seconds": round(seconds, 3),
+            "throughput_rps": round(len(latencies) / seconds, 2) if seconds else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+            "cache_hits": hits,
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+    async def run(self, suites):
+        await self.setup()
+        results = [await self.bench_build()]
+        if "build" in suites:
+            results.append(await self.bench_incremental())
+            results.append(await self.bench_rebuild())
+        if "queries" in suites:
+            for concurrency in self._args.concurrency:
+                results.append(await self.bench_queries(concurrency))
+        return {
+            "commit": get_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(self._args).items() if key not in ("output", "compare")},
+            "results": results
+        }
+
+
+# Métricas comparables entre reportes y si un valor mayor es una mejora
+METRICS = {
+    "seconds": False,
+    "embedded_per_second": True,
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False
+}
+
+
+def compare(baseline, report, tolerance):
+    """Compara dos reportes y devuelve las líneas del resumen y las regresiones detectadas."""
+    previous = {result["name"]: result for result in baseline["results"]}
+    lines, regressions = [], []
+    for result in report["results"]:
+        other = previous.get(result["name"])
+        if other is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = other.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            line = f"{result['name']:<22} {metric:<20} {old:>10} -> {new:>10} ({change:+.1f}%)"
+            lines.append(f"{line}  REGRESIÓN" if worse else line)
+            if worse:
+                regressions.append(line)
+    return lines, regressions
+
+
+def format_report(report):
+    lines = [f"Commit: {report['commit']}  Python {report['python']}  CPUs: {report['cpu_count']}"]
+    for result in report["results"]:
+        if "concurrency" in result:
+            lines.append(
+                f"{result['name']:<22} {result['requests']} consultas en {result['seconds']}s  "
+                f"{result['throughput_rps']} req/s  p50 {result['p50_ms']}ms  p95 {result['p95_ms']}ms  "
+                f"p99 {result['p99_ms']}ms  errores {result['errors']}  aciertos de caché {result['cache_hits']}  "
+                f"RSS {result['peak_rss_mb']['self']}MB"
+            )
+        else:
+            lines.append(
+                f"{result['name']:<22} {result['seconds']}s  {result['chunks']} fragmentos  "
+                f"{result['embedded']} embebidos ({result['embedded_per_second']}/s)  "
+                f"RSS {result['peak_rss_mb']['self']}MB (+{result['peak_rss_mb']['children']}MB hijos)"
+            )
+    return "\n".join(lines)
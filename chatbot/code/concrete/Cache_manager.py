@@ -5,22 +5,48 @@ from abstract.Composite.Compound_service import Compound_service
 from concrete.Constants_manager import Constants_manager
 from concrete.DB_manager import DB_manager
 
-from redis import Redis
+from utils.circuit_breaker import Circuit_breaker
+from utils.local_cache import Local_cache
+from utils.redis_utils import get_redis_url, get_async_redis, get_sync_redis
+from utils.text_utils import normalize_query
+from utils.sampled_logger import Sampled_logger
+from utils.metrics import REGISTRY, CACHE_LOOKUP_SECONDS, CACHE_LOOKUPS, CACHE_HIT_RATIO
+
 from langchain_redis import RedisSemanticCache
 from langchain_core.outputs import Generation
 
 import json
+import time
+import asyncio
+import hashlib
 
 class Cache_manager(Singleton, Observer, Compound_service):
     
 
+    KEY_PREFIX = "cache_index"
+
     def __init__(self, services_to_wait=[]):
         Compound_service.__init__(self, services_to_wait)
         self._cache = None
+        self._embeddings = None
+        self._ttl = None
+        self._local = None
+        self._breaker = None
+        self._timeout = None
+        self._max_connections = None
+        self._log = Sampled_logger("[Cache]")
+        self._l2_stats = {"hits": 0, "misses": 0, "errors": 0, "skipped": 0}
+        REGISTRY.add_collector(self._collect_metrics)
 
 
-    async def notify(self):
-        await self.clear_cache()
+    async def notify(self, changes):
+        # Solo un cambio de modelo de embeddings invalida los vectores ya cacheados; los
+        # cambios de prompt o de modelo de lenguaje particionan la caché por llm_string.
+        if changes.requires("clear_cache"):
+            await self.clear_cache()
+        # La caché semántica usa los embeddings de DB_manager: se reconecta si cambiaron
+        if not changes.requires("reconnect_cache", "reembed", "reload_embeddings"):
+            return
         await self.disconnect()
         await self.connect()
         await self.wait_for_connection()
@@ -31,49 +57,266 @@ class Cache_manager(Singleton, Observer, Compound_service):
         if self._service is None:
             const = Constants_manager.get_instance(Constants_manager)
             db = DB_manager.get_instance(DB_manager)
-            self._service = Redis(host=const.REDIS_HOST, port=const.REDIS_PORT)
+            url = get_redis_url(const.REDIS_HOST, const.REDIS_PORT)
+            self._service = get_async_redis(url, const.REDIS_MAX_CONNECTIONS, const.REDIS_TIMEOUT)
+            self._embeddings = db.get_embeddings()
+            # RedisSemanticCache requiere un cliente síncrono: sus llamadas se ejecutan en hilos
             self._cache = RedisSemanticCache(
-                redis_client=self._service,
-                embeddings= db.get_embeddings(),
+                redis_client=get_sync_redis(url, const.REDIS_MAX_CONNECTIONS, const.REDIS_TIMEOUT),
+                embeddings=self._embeddings,
                 distance_threshold=const.CACHE_THRESHOLD,
                 ttl=const.CACHE_TTL
             )
+            self._ttl = const.CACHE_TTL
+            self._timeout = const.REDIS_TIMEOUT
+            self._max_connections = const.REDIS_MAX_CONNECTIONS
+            self._log = Sampled_logger("[Cache]", const.LOG_SAMPLE_RATE)
+            self._breaker = Circuit_breaker(
+                failure_threshold=const.CACHE_BREAKER_FAILURES,
+                reset_timeout=const.CACHE_BREAKER_RESET,
+                slow_call_threshold=const.CACHE_SLOW_CALL
+            )
+            self._local = Local_cache(max_size=const.L1_CACHE_SIZE, ttl=min(const.L1_CACHE_TTL, const.CACHE_TTL))
             self._connected.set()
 
 
     async def _disconnect(self):
         """Cerrar conexión con Redis"""
         if self._service:
-            await self._service.close()
+            await self._service.aclose()
             self._service = None
             self._cache = None
+            self._local = None
+
+
+    async def _guarded(self, operation):
+        """Ejecuta una operación de Redis con timeout y circuit breaker.
+
+        El timeout es REDIS_TIMEOUT, el mismo que el de los sockets de ambos clientes; el
+        embedding se calcula antes y no cuenta. Si el circuito está abierto la operación se
+        omite y se devuelve None, de modo que una caché lenta nunca retrasa las consultas."""
+        if not self._breaker.allow():
+            self._l2_stats["skipped"] += 1
+            return None
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(operation(), self._timeout)
+        except Exception as e:
+            self._breaker.record(time.perf_counter() - start, ok=False)
+            self._l2_stats["errors"] += 1
+            self._log.error(f"Error en Redis: {type(e).__name__} {e}")
+            return None
+        self._breaker.record(time.perf_counter() - start)
+        return result
 
 
     async def clear_cache(self):
         """Limpiar cache"""
+        if self._local:
+            self._local.clear()
         if self._cache:
-            await self._cache.aclear()        
+            await asyncio.to_thread(self._cache.clear)
+            keys = [key async for key in self._service.scan_iter(match=f"{self.KEY_PREFIX}:*", count=500)]
+            for i in range(0, len(keys), 500):
+                await self._service.delete(*keys[i : i + 500])
+
+
+    def _entry_key(self, entry_id):
+        return f"{self.KEY_PREFIX}:entry:{entry_id}"
+
+
+    def _source_key(self, source):
+        return f"{self.KEY_PREFIX}:source:{source}"
+
+
+    async def invalidate_sources(self, sources):
+        """Invalida solo las respuestas construidas a partir de las fuentes indicadas."""
+        sources = set(sources)
+        if not self._cache or not sources:
+            return 0
+        self._local.invalidate(lambda answer: not sources.isdisjoint(answer.get("sources", [])))
+        try:
+            async with self._service.pipeline(transaction=False) as pipe:
+                for source in sources:
+                    pipe.smembers(self._source_key(source))
+                entry_ids = set().union(*await pipe.execute())
+
+            async with self._service.pipeline(transaction=False) as pipe:
+                for entry_id in entry_ids:
+                    pipe.delete(self._entry_key(entry_id.decode() if isinstance(entry_id, bytes) else entry_id))
+                for source in sources:
+                    pipe.delete(self._source_key(source))
+                await pipe.execute()
+            print(f"[Cache] {len(entry_ids)} respuestas invalidadas por cambios en {len(sources)} fuentes.")
+            return len(entry_ids)
+        except Exception as e:
+            self._log.error(f"Error al invalidar la cache: {e}")
+            return 0
+
+
+    def _local_key(self, prompt, model_config):
+        db = DB_manager.get_instance(DB_manager)
+        return (normalize_query(prompt), model_config, db.get_index_version())
+
+
+    def _decode(self, cached_result):
+        if not cached_result:
+            return None
+        try:
+            return json.loads(cached_result[0].text)
+        except Exception as e:
+            self._log.error(f"Error al decodificar JSON desde cache: {e}")
+            return None
+
+
+    async def _embed(self, prompts):
+        """Embebe los prompts antes de consultar Redis, fuera del circuit breaker.
+
+        El vector queda en el contexto de la petición y RedisSemanticCache lo reutiliza, de
+        modo que el tiempo medido por el breaker es solo el de Redis: un modelo de
+        embeddings lento no abre el circuito. Devuelve False si el embedding falló."""
+        try:
+            await asyncio.to_thread(self._embeddings.embed_queries, prompts)
+            return True
+        except Exception as e:
+            self._log.error(f"Error al embeber la consulta: {type(e).__name__} {e}")
+            return False
+
+
+    async def _lookup(self, prompt, model_config):
+        """Búsqueda en la caché semántica y verificación de que la entrada sigue vigente."""
+        answer = self._decode(await asyncio.to_thread(self._cache.lookup, prompt, model_config))
+        if answer is None:
+            return None
+        entry_id = answer.pop("entry_id", None)
+        if entry_id is None or not await self._service.exists(self._entry_key(entry_id)):
+            return None
+        return answer
+
+
+    async def _lookup_many(self, prompts, model_config):
+        """Búsquedas semánticas concurrentes y una única verificación (pipeline) de las entradas vigentes.
+
+        Las búsquedas simultáneas se limitan al tamaño del pool de Redis: más hilos solo
+        esperarían una conexión y ocuparían el executor que comparten las demás peticiones."""
+        semaphore = asyncio.Semaphore(self._max_connections)
+
+        async def lookup(prompt):
+            async with semaphore:
+                return await asyncio.to_thread(self._cache.lookup, prompt, model_config)
+
+        answers = [self._decode(cached_result) for cached_result in await asyncio.gather(*(lookup(prompt) for prompt in prompts))]
+        entry_ids = [answer.pop("entry_id", None) if answer else None for answer in answers]
+        async with self._service.pipeline(transaction=False) as pipe:
+            for entry_id in entry_ids:
+                pipe.exists(self._entry_key(entry_id))
+            alive = await pipe.execute()
+        return [
+            answer if answer is not None and entry_id is not None and exists else None
+            for answer, entry_id, exists in zip(answers, entry_ids, alive)
+        ]
+
 
-        
     async def get_cached_answer(self, prompt: str, model_config) -> dict | None:
-        """Devuelve un diccionario con 'answer' y 'sources' desde la caché."""
-        if self._cache:
-            try:
-                cached_result = await self._cache.alookup(prompt=prompt, llm_string=model_config)
-                if cached_result:
-                    try:
-                        return json.loads(cached_result[0].text)
-                    except Exception as e:
-                        print(f"[Cache] Error al decodificar JSON desde cache: {e}")
-            except Exception as e:
-                print(f"[Cache] Error al obtener cache: {e}")
-        return None
+        """Devuelve un diccionario con 'answer' y 'sources' desde la caché.
+
+        Primero consulta la caché local exacta (sin embeddings ni red) y luego la caché
+        semántica de Redis. Las respuestas cuyas fuentes fueron invalidadas se consideran
+        un fallo."""
+        if not self._cache:
+            return None
+        local_key = self._local_key(prompt, model_config)
+        with CACHE_LOOKUP_SECONDS.time(level="l1"):
+            answer = self._local.get(local_key)
+        if answer is not None:
+            CACHE_LOOKUPS.inc(level="l1", result="hit")
+            return dict(answer)
+        CACHE_LOOKUPS.inc(level="l1", result="miss")
+        with CACHE_LOOKUP_SECONDS.time(level="l2"):
+            answer = await self._guarded(lambda: self._lookup(prompt, model_config)) if await self._embed([prompt]) else None
+        if answer is None:
+            self._l2_stats["misses"] += 1
+            CACHE_LOOKUPS.inc(level="l2", result="miss")
+            return None
+        self._l2_stats["hits"] += 1
+        CACHE_LOOKUPS.inc(level="l2", result="hit")
+        self._local.set(local_key, answer)
+        return dict(answer)
+
+
+    async def get_cached_answers(self, prompts, model_config):
+        """Versión por lotes de 'get_cached_answer': devuelve una respuesta o None por cada prompt."""
+        results = [None] * len(prompts)
+        if not self._cache:
+            return results
+        pending = []
+        for i, prompt in enumerate(prompts):
+            answer = self._local.get(self._local_key(prompt, model_config))
+            CACHE_LOOKUPS.inc(level="l1", result="hit" if answer is not None else "miss")
+            if answer is not None:
+                results[i] = dict(answer)
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
+        with CACHE_LOOKUP_SECONDS.time(level="l2"):
+            answers = None
+            if await self._embed([prompts[i] for i in pending]):
+                answers = await self._guarded(lambda: self._lookup_many([prompts[i] for i in pending], model_config))
+        for i, answer in zip(pending, answers or [None] * len(pending)):
+            if answer is None:
+                self._l2_stats["misses"] += 1
+                CACHE_LOOKUPS.inc(level="l2", result="miss")
+                continue
+            self._l2_stats["hits"] += 1
+            CACHE_LOOKUPS.inc(level="l2", result="hit")
+            self._local.set(self._local_key(prompts[i], model_config), answer)
+            results[i] = dict(answer)
+        return results
+
+
+    async def _store(self, prompt, model_config, json_answer):
+        entry_id = hashlib.sha256(f"{model_config}:{prompt}".encode("utf-8")).hexdigest()
+        entry = {**json_answer, "entry_id": entry_id}
+        await asyncio.to_thread(self._cache.update, prompt, model_config, [Generation(text=json.dumps(entry))])
+
+        async with self._service.pipeline(transaction=False) as pipe:
+            pipe.set(self._entry_key(entry_id), 1, ex=self._ttl)
+            for source in json_answer.get("sources", []):
+                pipe.sadd(self._source_key(source), entry_id)
+                pipe.expire(self._source_key(source), self._ttl)
+            await pipe.execute()
+        return True
 
 
     async def set_cached_answer(self, prompt: str, model_config, json_answer):
-        """Guarda un diccionario en la caché con la respuesta y sus fuentes."""
+        """Guarda un diccionario en la caché con la respuesta y sus fuentes.
+
+        La entrada se registra en un set de Redis por cada fuente de la respuesta para
+        poder invalidarla cuando esa fuente cambie."""
         if self._cache:
-            try:   
-                await self._cache.aupdate(prompt=prompt, llm_string=model_config, return_val=[Generation(text=json.dumps(json_answer))])
-            except Exception as e:
-                print(f"[Cache] Error al guardar en cache: {e}")
\ No newline at end of file
+            self._local.set(self._local_key(prompt, model_config), dict(json_answer))
+            if not await self._embed([prompt]):
+                return
+            await self._guarded(lambda: self._store(prompt, model_config, json_answer))
+
+
+    def _collect_metrics(self):
+        stats = self.get_stats()
+        for level in ("l1", "l2"):
+            if "hit_ratio" in stats[level]:
+                CACHE_HIT_RATIO.set(stats[level]["hit_ratio"], level=level)
+
+
+    def get_stats(self):
+        """Contadores de aciertos, fallos y desalojos de cada nivel de la caché."""
+        l2_lookups = self._l2_stats["hits"] + self._l2_stats["misses"]
+        return {
+            "l1": self._local.get_stats() if self._local else {},
+            "l2": {
+                **self._l2_stats,
+                "hit_ratio": round(self._l2_stats["hits"] / l2_lookups, 4) if l2_lookups else 0.0,
+                "circuit": self._breaker.state if self._breaker else None
+            }
+        }
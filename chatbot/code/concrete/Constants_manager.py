@@ -7,8 +7,57 @@ import asyncio
 import signal
 from dotenv import load_dotenv
 
+
+class Config_changes:
+    """Claves modificadas en una recarga de la configuración y las acciones que implican."""
+
+    def __init__(self, keys, actions):
+        self.keys = set(keys)
+        self.actions = set(actions)
+
+    def requires(self, *actions):
+        return not self.actions.isdisjoint(actions)
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def __str__(self):
+        return f"claves={sorted(self.keys)} acciones={sorted(self.actions) or ['ninguna']}"
+
+
 class Constants_manager(Singleton, Observable):
 
+    # Acción que requiere el cambio de cada clave. Las claves que no figuran se leen en
+    # cada uso y no requieren ninguna acción.
+    ACTION_KEYS = {
+        # Documents_manager vuelve a clonar el repositorio
+        "sync_repo": ("RESOURCES_PATH", "REPO_NAME", "REPO_OWNER", "GITHUB_TOKEN"),
+        # DB_manager reconstruye el índice con el modelo actual (los vectores sin cambios salen del almacén)
+        "reindex": ("RESOURCES_PATH", "REPO_NAME", "REPO_OWNER", "DB_PATH", "COLLECTION_NAME", "CHUNK_SIZE", "CHUNK_OVERLAP"),
+        # DB_manager carga el modelo nuevo y vuelve a embeber todo el índice
+        "reembed": ("EMBEDDING_NAME", "EMBEDDING_BACKEND", "EMBEDDING_PARITY_MIN_RECALL"),
+        # DB_manager recarga el modelo sin tocar el índice
+        "reload_embeddings": (
+            "EMBEDDING_THREADS", "EMBEDDING_BATCH_SIZE", "EMBEDDING_CACHE_SIZE", "EMBEDDING_CACHE_DIR",
+            "EMBEDDING_SERVER", "EMBEDDING_SERVER_SOCKET", "EMBEDDING_SERVER_TIMEOUT"
+        ),
+        # Cache_manager descarta las respuestas cacheadas
+        "clear_cache": ("EMBEDDING_NAME",),
+        "reconnect_cache": (
+            "REDIS_HOST", "REDIS_PORT", "REDIS_MAX_CONNECTIONS", "REDIS_TIMEOUT", "CACHE_BREAKER_FAILURES",
+            "CACHE_BREAKER_RESET", "CACHE_SLOW_CALL", "CACHE_THRESHOLD", "CACHE_TTL", "L1_CACHE_SIZE", "L1_CACHE_TTL"
+        ),
+        "reconnect_history": (
+            "REDIS_HOST", "REDIS_PORT", "REDIS_MAX_CONNECTIONS", "REDIS_TIMEOUT", "HISTORY_BACKEND",
+            "HISTORY_TTL", "HISTORY_MAX_MESSAGES", "HISTORY_MAX_TOKENS", "HISTORY_MAX_SESSIONS"
+        ),
+        # LLM_manager reconstruye el modelo, los prompts y las cadenas
+        "rebuild_chains": (
+            "LLM_NAME", "TEMPERATURE", "MAX_TOKENS", "SYSTEM_PROMPT", "HISTORY_PROMPT", "K", "CONTEXT_TOKEN_BUDGET",
+            "CONTEXT_DEDUP_THRESHOLD", "GENERATION_CONCURRENCY", "GENERATION_QUEUE_SIZE", "GENERATION_TIMEOUT", "LOG_SAMPLE_RATE"
+        ),
+    }
+
     def __init__(self):
         Observable.__init__(self)
         self._env_path = os.path.join(os.getcwd(), ".env")
@@ -31,15 +80,43 @@ class Constants_manager(Singleton, Observable):
         self.REPO_OWNER = os.getenv("REPO_OWNER", "")
         self.DB_PATH = os.getenv('DB_PATH', 'wiki_db')
         self.COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'wiki_db')
+        self.REBUILD_GC_DELAY = int(os.getenv('REBUILD_GC_DELAY', "60"))
         self.EMBEDDING_NAME = os.getenv('EMBEDDING_NAME', 'sentence-transformers/all-mpnet-base-v2')
+        self.EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', "1024"))
+        self.EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+        self.EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', "0"))
+        self.EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', "32"))
+        self.EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', 'embeddings')
+        self.EMBEDDING_STORE_SIZE = int(os.getenv('EMBEDDING_STORE_SIZE', "500000"))
+        self.EMBEDDING_PARITY_MIN_RECALL = float(os.getenv('EMBEDDING_PARITY_MIN_RECALL', "0.9"))
+        self.EMBEDDING_SERVER = os.getenv('EMBEDDING_SERVER', "false").lower() == "true"
+        self.EMBEDDING_SERVER_SOCKET = os.getenv('EMBEDDING_SERVER_SOCKET', "/tmp/chatbot-embeddings.sock")
+        self.EMBEDDING_SERVER_MAX_BATCH = int(os.getenv('EMBEDDING_SERVER_MAX_BATCH', "64"))
+        self.EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv('EMBEDDING_SERVER_MAX_WAIT_MS', "5"))
+        self.EMBEDDING_SERVER_TIMEOUT = float(os.getenv('EMBEDDING_SERVER_TIMEOUT', "300"))
         self.K = int(os.getenv("K", "3"))
+        self.HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+        self.HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "2"))
+        self.RRF_K = int(os.getenv("RRF_K", "60"))
+        self.LEXICAL_FAST_PATH = os.getenv("LEXICAL_FAST_PATH", "true").lower() == "true"
+        self.LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", "3.0"))
+        self.BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+        self.BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "256"))
+        self.GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "2"))
+        self.GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "16"))
+        self.GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "30"))
+        self.CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+        self.CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
         self.TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
         self.MAX_TOKENS = int(os.getenv("MAX_TOKENS", "512"))
         self.MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "166"))
+        self.INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+        self.INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "2"))
         self.CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
-        self.CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "500"))
+        self.CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
         self.LLM_NAME = os.getenv('LLM_NAME', 'llama3.2')
         self.WEBHOOK_ROUTE = os.getenv('WEBHOOK_ROUTE', "/update-db")
+        self.UPDATE_JOB_TTL = int(os.getenv("UPDATE_JOB_TTL", "86400"))
         self.PORT = int(os.getenv('CHATBOT_PORT', "6000"))
         self.SYSTEM_PROMPT = os.getenv('SYSTEM_PROMPT', """Usa la siguiente información para responder a la pregunta del usuario.
             Si no sabes la respuesta, simplemente di que no lo sabes, no intentes inventar una respuesta.
@@ -54,9 +131,41 @@ class Constants_manager(Singleton, Observable):
         self.HISTORY_PROMPT =  os.getenv('HISTORY_PROMPT')
         self.REDIS_HOST=os.getenv("REDIS_HOST", "redis://redis")
         self.REDIS_PORT=os.getenv("REDIS_PORT", "6379")
+        self.REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+        self.REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+        self.CACHE_BREAKER_FAILURES = int(os.getenv("CACHE_BREAKER_FAILURES", "5"))
+        self.CACHE_BREAKER_RESET = float(os.getenv("CACHE_BREAKER_RESET", "30"))
+        self.CACHE_SLOW_CALL = float(os.getenv("CACHE_SLOW_CALL", "1.0"))
         self.CACHE_THRESHOLD = float(os.getenv("CACHE_THRESHOLD", "0.2"))
         self.CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+        self.L1_CACHE_SIZE = int(os.getenv("L1_CACHE_SIZE", "1024"))
+        self.L1_CACHE_TTL = int(os.getenv("L1_CACHE_TTL", "300"))
+        self.HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "redis")
+        self.HISTORY_TTL = int(os.getenv("HISTORY_TTL", "3600"))
+        self.HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+        self.HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "1024"))
+        self.HISTORY_MAX_SESSIONS = int(os.getenv("HISTORY_MAX_SESSIONS", "10000"))
+        self.LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+        self.OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+        self.OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "chatbot")
+        self.OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+
+    def _snapshot(self):
+        return {key: value for key, value in vars(self).items() if key.isupper()}
+
+    def get_changes(self, before):
+        """Compara la configuración actual con una anterior y deduce las acciones necesarias."""
+        after = self._snapshot()
+        keys = {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+        actions = {action for action, action_keys in self.ACTION_KEYS.items() if not keys.isdisjoint(action_keys)}
+        return Config_changes(keys, actions)
 
     async def load_environment_variables(self):
-        self.start()        
-        await self.notify_observers()
\ No newline at end of file
+        before = self._snapshot()
+        self.start()
+        changes = self.get_changes(before)
+        if not changes:
+            print("Configuración recargada sin cambios.")
+            return
+        print(f"Configuración recargada: {changes}")
+        await self.notify_observers(changes)
\ No newline at end of file
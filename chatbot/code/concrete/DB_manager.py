@@ -1,131 +1,672 @@
-import shutil
 from abstract.Singleton.Singleton import Singleton
 from abstract.Observer.Observer import Observer
 from abstract.Composite.Service import Service
 
 from concrete.Documents_manager import Documents_manager
 from concrete.Constants_manager import Constants_manager
+from concrete.DB_retriever import DB_retriever
+from concrete.Embeddings.Cached_embeddings import Cached_embeddings
+from concrete.Embeddings.Embeddings_factory import Embeddings_factory
+from concrete.Embeddings.Embedding_store import Embedding_store
+from concrete.Embeddings.Remote_embeddings import Remote_embeddings
+from concrete.Ingestion_pipeline import Ingestion_pipeline
+
+from utils.bm25_index import Bm25_index
+from utils.file_lock import File_lock
+from utils.json_chunker import Json_chunker
+from utils.text_utils import is_keyword_query
+from utils.metrics import SEARCH_SECONDS, SEARCH_MODE
 
 import os
+import json
+import time
 import asyncio
+import hashlib
+import threading
+from uuid import uuid4
 
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from langchain.schema import Document
 
 class DB_manager(Singleton, Observer, Service):
 
+    METADATA_PAGE_SIZE = 5000
+    ACTIVE_COLLECTION_FILE = "active_collection.json"
+    SHARED_STATE_CHECK_INTERVAL = 1.0
+    # Locks entre procesos: uno elige al worker que reconstruye, el otro serializa las escrituras
+    REBUILD_LOCK_FILE = "rebuild.lock"
+    WRITE_LOCK_FILE = "write.lock"
+
     def __init__(self):
         """Inicializa la base de datos y la conexión a Chroma."""
         Service.__init__(self)
         self._embeddings = None
+        self._embedding_store = None
+        self._client = None
         self._persist_dir = None
         self._collection_name = None
+        self._lexical_index = None
+        self._active_state = (None, {})
+        self._shared_state_stamp = None
+        self._shared_state_checked_at = 0.0
+        self._shared_state_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._rebuild_lock = asyncio.Lock()
+        self._gc_tasks = set()
+
+    async def notify(self, changes):
+        # Todos los workers reciben el cambio, pero solo uno reconstruye; el resto adopta su colección
+        if changes.requires("reembed"):
+            await self.rebuild(if_outdated=True)
+        elif changes.requires("reindex"):
+            # Mismo modelo: se vuelve a fragmentar sin recargarlo
+            await self.rebuild(reload_embeddings=False, if_outdated=True)
+        elif changes.requires("reload_embeddings"):
+            await self.reload_embeddings()
+
+    async def reload_embeddings(self):
+        """Recarga el modelo de embeddings (hilos, batch, servidor) sin reconstruir el índice."""
+        async with self._rebuild_lock:
+            if self._service is None:
+                await self.connect()
+                return
+            embeddings = await self._load_embeddings()
+            service = await asyncio.to_thread(self._open_collection, self._collection_name, embeddings)
+            self._service, self._embeddings = service, embeddings
+            print("Modelo de embeddings recargado.")
+
+    async def _load_embeddings(self):
+        """Carga el modelo de embeddings del worker o, con EMBEDDING_SERVER, se conecta al
+        servidor de embeddings compartido por todos los workers."""
+        const = Constants_manager.get_instance(Constants_manager)
+        cache_dir = os.path.join(os.getcwd(), const.RESOURCES_PATH, const.EMBEDDING_CACHE_DIR)
+        if const.EMBEDDING_SERVER:
+            # Se espera a que el servidor sirva el modelo configurado y se fija el adaptador a
+            # su id: un vector de otro modelo nunca llega al índice ni al almacén
+            info = await asyncio.to_thread(
+                Remote_embeddings(const.EMBEDDING_SERVER_SOCKET).wait_until_available,
+                const.EMBEDDING_SERVER_TIMEOUT, const.EMBEDDING_NAME, const.EMBEDDING_BACKEND
+            )
+            namespace = info["backend_id"]
+            embeddings = Remote_embeddings(const.EMBEDDING_SERVER_SOCKET, backend_id=namespace)
+        else:
+            factory = Embeddings_factory.from_settings(const, cache_dir)
+            embeddings = await asyncio.to_thread(factory.create)
+            namespace = factory.get_backend_id()
+        if self._embedding_store is None:
+            self._embedding_store = await asyncio.to_thread(
+                Embedding_store, os.path.join(cache_dir, "embeddings.sqlite3"), const.EMBEDDING_STORE_SIZE
+            )
+        return Cached_embeddings(
+            embeddings,
+            max_size=const.EMBEDDING_CACHE_SIZE,
+            store=self._embedding_store,
+            namespace=namespace
+        )
+
+    @staticmethod
+    def _open_client(persist_dir):
+        # chromadb se importa recién al conectar para no demorar el arranque del worker
+        import chromadb
+        return chromadb.PersistentClient(path=persist_dir)
 
-    async def notify(self):
-        await self.disconnect()
-        await self._delete_database()
-        await self.connect()
-        await self.wait_for_connection()
-        await self._build_database()
+    @staticmethod
+    def _create_collection(client, collection_name, embeddings):
+        from langchain_chroma import Chroma
+        return Chroma(client=client, collection_name=collection_name, embedding_function=embeddings)
+
+    def _open_collection(self, collection_name, embeddings):
+        return self._create_collection(self._client, collection_name, embeddings)
 
     async def _connect(self):
         if self._service is None:
             const = Constants_manager.get_instance(Constants_manager)
             self._persist_dir = os.path.join(os.getcwd(), const.RESOURCES_PATH, const.DB_PATH)
-            self._collection_name = const.COLLECTION_NAME
-            self._embeddings = await asyncio.to_thread(
-                lambda: HuggingFaceEmbeddings(model_name=const.EMBEDDING_NAME, show_progress=True)
-            )
-            self._service = await asyncio.to_thread(
-                lambda: Chroma(
-                    persist_directory=self._persist_dir,
-                    embedding_function=self._embeddings,
-                    collection_name=self._collection_name
-                )
+            # El cliente de Chroma y el modelo de embeddings se cargan en paralelo
+            self._client, self._embeddings = await asyncio.gather(
+                asyncio.to_thread(self._open_client, self._persist_dir),
+                self._load_embeddings()
             )
+            self._collection_name = self._read_active_collection() or const.COLLECTION_NAME
+            self._service = await asyncio.to_thread(self._open_collection, self._collection_name, self._embeddings)
+            self._lexical_index = await asyncio.to_thread(self._load_lexical_index, self._service, self._collection_name)
+            self._shared_state_stamp = self._get_shared_state_stamp()
             self._connected.set()
 
     async def _disconnect(self):
         """Desconecta la base de datos liberando los recursos."""
         if self._service:
             self._service = None
+            self._client = None
             self._embeddings = None
+            self._lexical_index = None
             self._connected.clear()
 
+    def _get_active_state(self):
+        """Devuelve el estado compartido {"collection", "generation", ...}; solo relee el
+        archivo cuando cambia su firma (mtime, tamaño)."""
+        path = os.path.join(self._persist_dir, self.ACTIVE_COLLECTION_FILE)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return {}
+        stamp, state = self._active_state
+        if stamp != (stat.st_mtime_ns, stat.st_size):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    state = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"No se pudo leer {path}: {e}")
+                return state
+            self._active_state = ((stat.st_mtime_ns, stat.st_size), state)
+        return state
+
+    def _read_active_collection(self):
+        return self._get_active_state().get("collection")
+
+    def _write_active_collection(self, collection_name, settings=None, commit=None, bump=True):
+        """Publica la colección activa, el último commit indexado y, con 'bump', incrementa la
+        generación del índice, reemplazando el archivo de forma atómica. Lo llama el único
+        proceso que escribe en el índice."""
+        path = os.path.join(self._persist_dir, self.ACTIVE_COLLECTION_FILE)
+        state = self._get_active_state()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({
+                "collection": collection_name,
+                "generation": state.get("generation", 0) + (1 if bump else 0),
+                "activated_at": state.get("activated_at", time.time()) if state.get("collection") == collection_name else time.time(),
+                "updated_at": time.time(),
+                "settings": settings if settings is not None else state.get("settings"),
+                "commit": commit if commit is not None else state.get("commit")
+            }, file)
+        os.replace(tmp_path, path)
+
+    def _lexical_index_path(self, collection_name, persist_dir=None):
+        return os.path.join(persist_dir or self._persist_dir, f"{collection_name}.bm25.pkl")
+
+    def _get_shared_state_stamp(self):
+        """Firma (mtime, tamaño) del archivo de la colección activa y del índice léxico persistido."""
+        stamp = []
+        for path in (os.path.join(self._persist_dir, self.ACTIVE_COLLECTION_FILE), self._lexical_index_path(self._collection_name)):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _refresh_shared_state(self, force=False, embeddings=None):
+        """Adopta la colección activa y el índice léxico que otro worker haya publicado.
+
+        Con varios workers solo uno ejecuta cada actualización; los demás detectan el cambio
+        en los archivos compartidos (a lo sumo una vez por segundo) y recargan su copia.
+        Con 'embeddings' la colección se vuelve a abrir con ese modelo."""
+        now = time.monotonic()
+        if self._service is None or (not force and now - self._shared_state_checked_at < self.SHARED_STATE_CHECK_INTERVAL):
+            return
+        self._shared_state_checked_at = now
+        if embeddings is None and self._get_shared_state_stamp() == self._shared_state_stamp:
+            return
+        with self._shared_state_lock:
+            stamp = self._get_shared_state_stamp()
+            if embeddings is None and stamp == self._shared_state_stamp:
+                return
+            const = Constants_manager.get_instance(Constants_manager)
+            collection_name = self._read_active_collection() or const.COLLECTION_NAME
+            service = self._service
+            if embeddings is not None:
+                service = self._open_collection(collection_name, embeddings)
+                self._embeddings = embeddings
+            elif collection_name != self._collection_name:
+                print(f"Adoptando la colección activa {collection_name}...")
+                service = self._open_collection(collection_name, self._embeddings)
+            try:
+                lexical_index = Bm25_index.load(self._lexical_index_path(collection_name))
+            except Exception as e:
+                print(f"No se pudo recargar el índice léxico de {collection_name}: {e}")
+                lexical_index = None
+            if lexical_index is None and collection_name == self._collection_name:
+                lexical_index = self._lexical_index
+            self._service, self._collection_name, self._lexical_index = service, collection_name, lexical_index
+            self._shared_state_stamp = self._get_shared_state_stamp()
+
+    def _load_lexical_index(self, vectorstore, collection_name):
+        """Carga el índice BM25 de la colección o lo reconstruye desde los documentos de Chroma."""
+        path = self._lexical_index_path(collection_name)
+        index = self._read_lexical_index(path, vectorstore)
+        if index is not None:
+            return index
+
+        # Con el lock de escritura solo un worker reconstruye el índice; los demás, al
+        # obtenerlo, cargan el que acaba de guardar
+        with File_lock(os.path.join(self._persist_dir, self.WRITE_LOCK_FILE)):
+            index = self._read_lexical_index(path, vectorstore, quiet=True)
+            if index is not None:
+                return index
+            print(f"Construyendo el índice léxico de {collection_name}...")
+            index = Bm25_index()
+            offset = 0
+            while True:
+                page = vectorstore.get(include=["documents", "metadatas"], limit=self.METADATA_PAGE_SIZE, offset=offset)
+                index.add(page["ids"], page["documents"], page["metadatas"])
+                if len(page["ids"]) < self.METADATA_PAGE_SIZE:
+                    break
+                offset += self.METADATA_PAGE_SIZE
+            index.save(path)
+        return index
+
+    def _read_lexical_index(self, path, vectorstore, quiet=False):
+        """Carga el índice BM25 guardado si está al día con la colección; si no, devuelve None."""
+        try:
+            index = Bm25_index.load(path)
+        except Exception as e:
+            if not quiet:
+                print(f"No se pudo cargar el índice léxico {path}: {e}")
+            return None
+        if index is not None and len(index) == vectorstore._collection.count():
+            return index
+        return None
+
     def get_retriever(self, k):
-        return self._service.as_retriever(search_kwargs={'k': k})
+        return DB_retriever(db=self, k=k)
+
+    def _lexical_documents(self, index, results):
+        documents = []
+        for chunk_id, score in results:
+            entry = index.get(chunk_id)
+            if entry is not None:
+                text, metadata = entry
+                documents.append(Document(id=chunk_id, page_content=text, metadata={**metadata, "score": score}))
+        return documents
+
+    def _use_lexical_fast_path(self, query, lexical):
+        const = Constants_manager.get_instance(Constants_manager)
+        return const.LEXICAL_FAST_PATH and lexical and lexical[0][1] >= const.LEXICAL_MIN_SCORE and is_keyword_query(query)
+
+    def _fuse(self, index, vector_documents, lexical, k):
+        """Fusiona por Reciprocal Rank Fusion los candidatos vectoriales (ordenados) y los léxicos.
+
+        Ambas listas se cruzan por el ID del documento en Chroma, que es también la clave del
+        índice léxico y existe aunque el fragmento se haya indexado sin 'chunk_hash'."""
+        const = Constants_manager.get_instance(Constants_manager)
+        scores = {}
+        documents = {}
+        for rank, document in enumerate(vector_documents):
+            chunk_id = document.id or self.get_chunk_id(document)
+            documents[chunk_id] = document
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (const.RRF_K + rank + 1)
+        for rank, (chunk_id, _) in enumerate(lexical):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (const.RRF_K + rank + 1)
+
+        results = []
+        for chunk_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]:
+            if chunk_id in documents:
+                document = documents[chunk_id]
+                results.append(Document(id=chunk_id, page_content=document.page_content, metadata={**document.metadata, "score": score}))
+            else:
+                results.extend(self._lexical_documents(index, [(chunk_id, score)]))
+        return results
+
+    def search(self, query, k):
+        """Búsqueda híbrida: fusiona por RRF los candidatos vectoriales y los de BM25.
+
+        Las consultas con forma de palabra clave se resuelven solo con BM25 si su mejor
+        resultado es suficientemente bueno, sin embeber la consulta."""
+        const = Constants_manager.get_instance(Constants_manager)
+        self._refresh_shared_state()
+        service, index = self._service, self._lexical_index
+        if index is None or not const.HYBRID_SEARCH:
+            SEARCH_MODE.inc(mode="vector")
+            with SEARCH_SECONDS.time(index="vector"):
+                return service.similarity_search(query, k=k)
+
+        candidates = k * max(1, const.HYBRID_CANDIDATES)
+        with SEARCH_SECONDS.time(index="lexical"):
+            lexical = index.search(query, candidates)
+        if self._use_lexical_fast_path(query, lexical):
+            SEARCH_MODE.inc(mode="lexical")
+            return self._lexical_documents(index, lexical[:k])
+
+        SEARCH_MODE.inc(mode="hybrid")
+        with SEARCH_SECONDS.time(index="vector"):
+            vector_results = service.similarity_search(query, k=candidates)
+        return self._fuse(index, vector_results, lexical, k)
+
+    def search_many(self, queries, k):
+        """Búsqueda de varias consultas: un único batch de embeddings y una única consulta
+        multi-vector a Chroma para todas las que no resuelve el camino léxico."""
+        const = Constants_manager.get_instance(Constants_manager)
+        self._refresh_shared_state()
+        service, index, embeddings = self._service, self._lexical_index, self._embeddings
+        hybrid = index is not None and const.HYBRID_SEARCH
+        candidates = k * max(1, const.HYBRID_CANDIDATES) if hybrid else k
+
+        results = [None] * len(queries)
+        lexical = [[] for _ in queries]
+        if hybrid:
+            with SEARCH_SECONDS.time(index="lexical"):
+                lexical = [index.search(query, candidates) for query in queries]
+        pending = []
+        for i, query in enumerate(queries):
+            if hybrid and self._use_lexical_fast_path(query, lexical[i]):
+                SEARCH_MODE.inc(mode="lexical")
+                results[i] = self._lexical_documents(index, lexical[i][:k])
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
+        vectors = embeddings.embed_queries([queries[i] for i in pending])
+        with SEARCH_SECONDS.time(index="vector"):
+            response = service._collection.query(query_embeddings=vectors, n_results=candidates, include=["documents", "metadatas"])
+        for position, i in enumerate(pending):
+            documents = [
+                Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                for chunk_id, text, metadata in zip(response["ids"][position], response["documents"][position], response["metadatas"][position])
+            ]
+            SEARCH_MODE.inc(mode="hybrid" if hybrid else "vector")
+            results[i] = self._fuse(index, documents, lexical[i], k) if hybrid else documents
+        return results
+
+    async def asearch(self, query, k):
+        return await asyncio.to_thread(self.search, query, k)
+
+    async def asearch_many(self, queries, k):
+        return await asyncio.to_thread(self.search_many, queries, k)
+
+    def get_index_version(self):
+        """Versión del índice compartida por todos los workers: la colección activa y la
+        generación publicadas en el archivo de la colección activa, que cambian con cada
+        actualización o reconstrucción hecha por cualquier worker."""
+        state = self._get_active_state()
+        return f"{state.get('collection') or self._collection_name}:{state.get('generation', 0)}"
 
     def get_embeddings(self):
+        """Devuelve los embeddings compartidos, que reutilizan el vector de cada consulta."""
         return self._embeddings
 
     def exists(self):
-        return os.path.exists(self._persist_dir)
+        return self._service is not None and os.path.exists(self._persist_dir)
+
+    @staticmethod
+    def get_chunk_id(chunk):
+        """ID determinista de un fragmento, derivado de su fuente y del hash de su contenido.
+
+        Los fragmentos indexados antes de que existiera 'chunk_hash' usan el hash de su texto."""
+        chunk_hash = chunk.metadata.get("chunk_hash") or hashlib.md5(chunk.page_content.encode("utf-8")).hexdigest()
+        key = f"{chunk.metadata.get('source', '')}:{chunk_hash}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _unique_chunks(self, chunks):
+        """Indexa los fragmentos por ID descartando los repetidos dentro de un mismo archivo."""
+        return {self.get_chunk_id(chunk): chunk for chunk in chunks}
+
+    def _get_indexed_chunks(self, sources=None):
+        """Consulta solo los metadatos 'source', 'hash' y 'chunker_version' del índice, paginando los resultados.
+
+        Si se indican fuentes, la consulta se restringe a ellas. Devuelve
+        {source: {"hash": hash_del_archivo, "ids": {ids de fragmentos}, "outdated": bool}},
+        donde 'outdated' indica que algún fragmento se generó con otra versión del fragmentador."""
+        indexed = {}
+        if sources is None:
+            filters = [None]
+        else:
+            sources = sorted(set(sources))
+            filters = [{"source": {"$in": sources[i : i + self.METADATA_PAGE_SIZE]}} for i in range(0, len(sources), self.METADATA_PAGE_SIZE)]
+        for where in filters:
+            offset = 0
+            while True:
+                page = self._service.get(where=where, include=["metadatas"], limit=self.METADATA_PAGE_SIZE, offset=offset)
+                for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                    entry = indexed.setdefault(metadata["source"], {"hash": metadata.get("hash", ""), "ids": set(), "outdated": False})
+                    entry["ids"].add(chunk_id)
+                    entry["outdated"] = entry["outdated"] or metadata.get("chunker_version") != Json_chunker.VERSION
+                if len(page["ids"]) < self.METADATA_PAGE_SIZE:
+                    break
+                offset += self.METADATA_PAGE_SIZE
+        return indexed
+
+    def get_indexed_commit(self):
+        """Último commit del repositorio indexado con éxito (None si no se conoce)."""
+        return self._get_active_state().get("commit")
 
-    def update_vectors(self):
-        """Actualiza la base de datos vectorial en Chroma detectando archivos nuevos, eliminados y modificados."""
+    def update_vectors(self, changes=None, on_progress=None, commit=None):
+        """Actualiza la base de datos vectorial en Chroma a nivel de fragmento.
+
+        Si se reciben los cambios del repositorio solo se procesan esos archivos; si no,
+        se escanea el repositorio completo. Solo se embeben los fragmentos nuevos y se
+        eliminan los que desaparecieron. Devuelve las fuentes afectadas. Si termina bien y
+        se indica 'commit', se registra como el último commit indexado.
+
+        Las escrituras se serializan entre procesos; antes de escribir se adopta el estado
+        que haya publicado otro worker para no pisar su índice léxico."""
+        with File_lock(os.path.join(self._persist_dir, self.WRITE_LOCK_FILE)), self._write_lock:
+            self._refresh_shared_state(force=True)
+            return self._update_vectors(changes, on_progress, commit)
+
+    def _update_vectors(self, changes, on_progress, commit):
         print("Actualizando vectores en Chroma...")
 
+        const = Constants_manager.get_instance(Constants_manager)
         doc_manager = Documents_manager.get_instance(Documents_manager)
-        existing_docs = {metadata["source"]: metadata.get("hash", "") for metadata in self._service.get()["metadatas"]}
-        repo_docs = {doc.metadata["source"]: doc.metadata["hash"] for doc in doc_manager.load_documents()}
+        settings = self._get_active_state().get("settings") or {}
+        if changes is not None and settings.get("chunker") != Json_chunker.VERSION:
+            # Índice generado con otra versión del fragmentador: se revisa el repositorio completo
+            print("El índice se fragmentó con otra versión del fragmentador, se revisan todos los documentos...")
+            changes = None
+        if changes is None:
+            indexed = self._get_indexed_chunks()
+            filenames = doc_manager.list_documents()
+        else:
+            if changes.is_empty():
+                print("No hay documentos modificados.")
+            sources = changes.sources_to_index() + changes.sources_to_remove()
+            indexed = self._get_indexed_chunks(sources)
+            filenames = [filename for filename in set(sources) if doc_manager.document_exists(filename)]
+        repo_hashes = {filename: doc_manager.get_document_hash(filename) for filename in filenames}
+
+        ids_to_delete = []
+        ids_to_touch = {}
+        affected_sources = set()
 
         # Archivos eliminados
-        deleted_files = set(existing_docs) - set(repo_docs)
-        if deleted_files:
-            print(f"Eliminando {len(deleted_files)} documentos obsoletos...")
-            self._service.delete(list(deleted_files))
+        for filename in set(indexed) - set(repo_hashes):
+            ids_to_delete.extend(indexed[filename]["ids"])
+            affected_sources.add(filename)
 
         # Archivos modificados o nuevos
-        updated_documents = []
-        modified_files = []
-        for filename, file_hash in repo_docs.items():
-            if filename not in existing_docs or existing_docs[filename] != file_hash:
-                modified_files.append(filename)
-                doc = doc_manager.get_document(filename)
-                updated_documents.append(doc)
-
-        # Eliminar las versiones antiguas de los archivos modificados antes de reindexarlos
-        if modified_files:
-            print(f"Eliminando {len(modified_files)} documentos modificados antes de reindexarlos...")
-            for file in modified_files:
-                self._service.delete(where={"source": file})
-            print(f"{len(modified_files)} documentos obsoletos eliminados.")
-        
-        # Reindexar archivos nuevos o modificados
-        if updated_documents:
-            print(f"Indexando {len(updated_documents)} documentos nuevos o modificados...")
-            docs_chunked = doc_manager.get_docs_chunked(updated_documents)
-            self.batched_insert(docs_chunked)
-
-        print("Vectores actualizados correctamente.")
-
-    async def _delete_database(self):
-        """Elimina completamente la base de datos de Chroma."""
-        print("Eliminando base de datos...")
-        if self.exists():
-            await asyncio.to_thread(shutil.rmtree, self._persist_dir)
-            print("Base de datos eliminada.")
-        else:
-            print("La base de datos no existe.")
+        changed_files = [
+            filename for filename, file_hash in repo_hashes.items()
+            if indexed.get(filename, {}).get("hash") != file_hash or indexed[filename]["outdated"]
+        ]
+        affected_sources.update(changed_files)
 
-    async def _build_database(self):
-        """Construye completamente la base de datos de Chroma."""
-        print("Construyendo base de datos...")
-        const = Constants_manager.get_instance(Constants_manager)
+        def chunk_filter(filename, chunks):
+            """Diff a nivel de fragmento: solo se embeben los fragmentos que no están indexados."""
+            indexed_ids = indexed.get(filename, {}).get("ids", set())
+            chunks = self._unique_chunks(chunks)
+            ids_to_delete.extend(indexed_ids - set(chunks))
+            ids_to_touch.update({chunk_id: chunks[chunk_id].metadata for chunk_id in indexed_ids & set(chunks)})
+            return [chunk for chunk_id, chunk in chunks.items() if chunk_id not in indexed_ids]
+
+        if changed_files:
+            print(f"Procesando {len(changed_files)} documentos nuevos o modificados...")
+            self._get_pipeline(on_progress).run(
+                doc_manager.get_repo_path(), changed_files, const.CHUNK_SIZE, const.CHUNK_OVERLAP, chunk_filter
+            )
 
-        # Asegurarse de que el directorio de persistencia se crea nuevamente
-        os.makedirs(const.DB_PATH, exist_ok=True)
+        # Se eliminan los fragmentos obsoletos después de insertar los nuevos
+        if ids_to_delete:
+            print(f"Eliminando {len(ids_to_delete)} fragmentos obsoletos...")
+            for i in range(0, len(ids_to_delete), self.METADATA_PAGE_SIZE):
+                self._service.delete(ids=ids_to_delete[i : i + self.METADATA_PAGE_SIZE])
+            if self._lexical_index is not None:
+                self._lexical_index.remove(ids_to_delete)
 
+        # Los fragmentos sin cambios solo actualizan el hash de su archivo, sin volver a embeberse
+        if ids_to_touch:
+            touched = list(ids_to_touch.items())
+            for i in range(0, len(touched), self.METADATA_PAGE_SIZE):
+                batch = touched[i : i + self.METADATA_PAGE_SIZE]
+                self._service._collection.update(
+                    ids=[chunk_id for chunk_id, _ in batch],
+                    metadatas=[metadata for _, metadata in batch]
+                )
+
+        # Tras una revisión completa todo el índice usa la versión actual del fragmentador
+        upgraded = changes is None and settings.get("chunker") != Json_chunker.VERSION
+        if affected_sources or upgraded:
+            if self._lexical_index is not None:
+                self._lexical_index.save(self._lexical_index_path(self._collection_name))
+            self._write_active_collection(self._collection_name, {**settings, "chunker": Json_chunker.VERSION} if upgraded else None, commit)
+            self._shared_state_stamp = self._get_shared_state_stamp()
+        elif commit is not None and commit != self.get_indexed_commit():
+            # Sin documentos afectados el índice no cambia: solo se registra el commit
+            self._write_active_collection(self._collection_name, commit=commit, bump=False)
+            self._shared_state_stamp = self._get_shared_state_stamp()
+        print(f"Vectores actualizados correctamente ({len(affected_sources)} documentos afectados).")
+        return affected_sources
+
+    def _build_database(self, vectorstore, embeddings, lexical_index):
+        """Construye completamente una colección de Chroma y su índice léxico, y verifica su contenido."""
+        print(f"Construyendo la colección {vectorstore._collection.name}...")
+        const = Constants_manager.get_instance(Constants_manager)
         doc_manager = Documents_manager.get_instance(Documents_manager)
-        documents = await asyncio.to_thread(doc_manager.load_documents)
+        filenames = doc_manager.list_documents()
+        stats = self._get_pipeline(vectorstore=vectorstore, embeddings=embeddings, lexical_index=lexical_index).run(
+            doc_manager.get_repo_path(), filenames, const.CHUNK_SIZE, const.CHUNK_OVERLAP,
+            lambda filename, chunks: list(self._unique_chunks(chunks).values())
+        )
+
+        count = vectorstore._collection.count()
+        if filenames and (count == 0 or not vectorstore.similarity_search(filenames[0], k=1)):
+            raise RuntimeError(f"La colección {vectorstore._collection.name} quedó vacía o no responde consultas.")
+        print(f"Colección construida con {stats.embedded} fragmentos.")
+
+    def _get_build_settings(self, embeddings):
+        """Configuración con la que se construye una colección; si coincide con la de la
+        colección activa no hace falta reconstruirla."""
+        const = Constants_manager.get_instance(Constants_manager)
+        return {
+            "embeddings": embeddings.get_namespace(),
+            "chunk_size": const.CHUNK_SIZE,
+            "chunk_overlap": const.CHUNK_OVERLAP,
+            "chunker": Json_chunker.VERSION
+        }
+
+    async def rebuild(self, reload_embeddings=True, if_outdated=False):
+        """Reconstruye el índice en una colección nueva y la activa de forma atómica.
+
+        Con 'reload_embeddings' en False se reutiliza el modelo ya cargado. Mientras se
+        construye, las consultas siguen usando la colección activa. Si la construcción o la
+        verificación fallan, la colección nueva se descarta y la anterior sigue activa.
+
+        Entre procesos solo un worker reconstruye a la vez. Con 'if_outdated', si la colección
+        activa ya se construyó con la configuración actual (p. ej. la reconstruyó otro worker
+        que recibió la misma señal), solo se adopta. La colección reemplazada se elimina
+        pasado un margen para no cortar consultas en curso."""
+        async with self._rebuild_lock:
+            const = Constants_manager.get_instance(Constants_manager)
+            if self._service is None:
+                await self.connect()
+
+            persist_dir = os.path.join(os.getcwd(), const.RESOURCES_PATH, const.DB_PATH)
+            client = self._client
+            if persist_dir != self._persist_dir:
+                client = await asyncio.to_thread(self._open_client, persist_dir)
+
+            embeddings = await self._load_embeddings() if reload_embeddings else self._embeddings
+            settings = self._get_build_settings(embeddings)
+            rebuild_lock = File_lock(os.path.join(persist_dir, self.REBUILD_LOCK_FILE))
+            if not await asyncio.to_thread(rebuild_lock.acquire, False):
+                print("Otro worker está reconstruyendo el índice, se espera a que termine...")
+                await asyncio.to_thread(rebuild_lock.acquire)
+            try:
+                if if_outdated and persist_dir == self._persist_dir and self._get_active_state().get("settings") == settings:
+                    await asyncio.to_thread(self._refresh_shared_state, True, embeddings)
+                    print(f"Colección {self._collection_name} adoptada: ya estaba construida con la configuración actual.")
+                    return
+                await self._build_and_activate(client, persist_dir, embeddings, settings)
+            finally:
+                rebuild_lock.release()
+
+            # Se conserva la referencia: el bucle de eventos solo guarda referencias débiles a las tareas
+            task = asyncio.create_task(self._collect_garbage(const.COLLECTION_NAME, const.REBUILD_GC_DELAY))
+            self._gc_tasks.add(task)
+            task.add_done_callback(self._on_gc_done)
+
+    async def _build_and_activate(self, client, persist_dir, embeddings, settings):
+        const = Constants_manager.get_instance(Constants_manager)
+        # Sufijo aleatorio: dos reconstrucciones nunca comparten nombre
+        collection_name = f"{const.COLLECTION_NAME}_{uuid4().hex[:12]}"
+        vectorstore = await asyncio.to_thread(self._create_collection, client, collection_name, embeddings)
+        lexical_index = Bm25_index()
+
+        # Las actualizaciones de cualquier worker esperan a que la colección nueva quede activa
+        write_lock = File_lock(os.path.join(persist_dir, self.WRITE_LOCK_FILE))
+
+        def build():
+            with self._write_lock:
+                self._build_database(vectorstore, embeddings, lexical_index)
+                lexical_index.save(self._lexical_index_path(collection_name, persist_dir))
+
+        await asyncio.to_thread(write_lock.acquire)
+        try:
+            try:
+                await asyncio.to_thread(build)
+            except Exception as e:
+                print(f"Error al reconstruir la base de datos, se mantiene {self._collection_name}: {e}")
+                await asyncio.to_thread(client.delete_collection, collection_name)
+                raise
+
+            # Intercambio atómico: las consultas nuevas ya usan la colección nueva
+            self._client, self._persist_dir = client, persist_dir
+            self._service, self._embeddings, self._collection_name = vectorstore, embeddings, collection_name
+            self._lexical_index = lexical_index
+            self._write_active_collection(collection_name, settings)
+            self._shared_state_stamp = self._get_shared_state_stamp()
+        finally:
+            write_lock.release()
+        print(f"Colección {collection_name} activada.")
 
-        docs_chunked = await asyncio.to_thread(doc_manager.get_docs_chunked, documents)
-        asyncio.to_thread(self.batched_insert, docs_chunked)
+    def _on_gc_done(self, task):
+        self._gc_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error al eliminar las colecciones inactivas: {task.exception()}")
 
-        print(f"Base de datos construida con {len(docs_chunked)} fragmentos.")
+    async def _collect_garbage(self, prefix, delay):
+        """Elimina las versiones de la colección que no figuran en el archivo compartido de la
+        colección activa. Se ejecuta con el lock de reconstrucción tomado, de modo que nunca
+        borra una colección que otro worker esté construyendo."""
+        await asyncio.sleep(delay)
+        async with self._rebuild_lock:
+            rebuild_lock = File_lock(os.path.join(self._persist_dir, self.REBUILD_LOCK_FILE))
+            await asyncio.to_thread(rebuild_lock.acquire)
+            try:
+                client = self._client
+                active = self._read_active_collection()
+                if active is None:
+                    return
+                for name in await asyncio.to_thread(client.list_collections):
+                    name = getattr(name, "name", name)
+                    if name != active and (name == prefix or name.startswith(f"{prefix}_")):
+                        print(f"Eliminando la colección inactiva {name}...")
+                        await asyncio.to_thread(client.delete_collection, name)
+                        path = self._lexical_index_path(name)
+                        if os.path.exists(path):
+                            os.remove(path)
+            finally:
+                rebuild_lock.release()
 
-    def batched_insert(self, documents):
+    def _get_pipeline(self, on_progress=None, vectorstore=None, embeddings=None, lexical_index=None):
         const = Constants_manager.get_instance(Constants_manager)
-        for i in range(0, len(documents), const.MAX_BATCH_SIZE):
-            self._service.add_documents(documents[i : i + const.MAX_BATCH_SIZE])
-            print(f"Insertado batch {i // const.MAX_BATCH_SIZE + 1}/{(len(documents) // const.MAX_BATCH_SIZE) + 1}")
\ No newline at end of file
+        return Ingestion_pipeline(
+            vectorstore=vectorstore or self._service,
+            embeddings=embeddings or self._embeddings,
+            get_chunk_id=self.get_chunk_id,
+            batch_size=const.MAX_BATCH_SIZE,
+            workers=const.INGEST_WORKERS,
+            queue_size=const.INGEST_QUEUE_SIZE,
+            on_progress=on_progress,
+            lexical_index=lexical_index if lexical_index is not None else self._lexical_index
+        )
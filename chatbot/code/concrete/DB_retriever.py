@@ -0,0 +1,18 @@
+from typing import Any
+
+from langchain_core.retrievers import BaseRetriever
+
+class DB_retriever(BaseRetriever):
+    """Retriever que resuelve la colección activa de DB_manager en cada consulta.
+
+    Así las consultas pasan a la nueva colección en cuanto DB_manager la activa,
+    sin reconstruir las cadenas que lo usan."""
+
+    db: Any
+    k: int = 3
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.db.search(query, self.k)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        return await self.db.asearch(query, self.k)
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from utils.metrics import EMBEDDING_SECONDS
+
+# Vectores calculados durante la petición en curso: {texto: vector}
+_request_vectors = ContextVar("request_vectors", default=None)
+
+class Cached_embeddings(Embeddings):
+    """Envuelve un modelo de embeddings para calcular cada consulta una única vez.
+
+    Los vectores de consulta se guardan en un contexto por petición, compartido por la
+    caché semántica y la búsqueda vectorial, y en un LRU acotado de consultas recientes.
+    Los vectores de documentos se buscan primero en el almacén persistente, si lo hay."""
+
+    def __init__(self, embeddings, max_size=1024, store=None, namespace=""):
+        self._embeddings = embeddings
+        self._max_size = max_size
+        self._store = store
+        self._namespace = namespace
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def request_context(self):
+        """Abre un contexto en el que cada consulta se embebe como máximo una vez."""
+        token = _request_vectors.set({})
+        try:
+            yield
+        finally:
+            _request_vectors.reset(token)
+
+    def _get_cached(self, text):
+        vectors = _request_vectors.get()
+        if vectors is not None and text in vectors:
+            return vectors[text]
+        with self._lock:
+            vector = self._lru.get(text)
+            if vector is not None:
+                self._lru.move_to_end(text)
+        if vector is not None and vectors is not None:
+            vectors[text] = vector
+        return vector
+
+    def _set_cached(self, text, vector):
+        vectors = _request_vectors.get()
+        if vectors is not None:
+            vectors[text] = vector
+        with self._lock:
+            self._lru[text] = vector
+            self._lru.move_to_end(text)
+            while len(self._lru) > self._max_size:
+                self._lru.popitem(last=False)
+
+    def embed_query(self, text):
+        vector = self._get_cached(text)
+        if vector is None:
+            with EMBEDDING_SECONDS.time(kind="query"):
+                vector = self._embeddings.embed_query(text)
+            self._set_cached(text, vector)
+        return vector
+
+    async def aembed_query(self, text):
+        vector = self._get_cached(text)
+        if vector is None:
+            with EMBEDDING_SECONDS.time(kind="query"):
+                vector = await self._embeddings.aembed_query(text)
+            self._set_cached(text, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        """Embebe varias consultas en un único batch del modelo, reutilizando las ya cacheadas."""
+        vectors = {text: self._get_cached(text) for text in texts}
+        missing = list(dict.fromkeys(text for text, vector in vectors.items() if vector is None))
+        if missing:
+            with EMBEDDING_SECONDS.time(kind="query_batch"):
+                computed = self._embeddings.embed_documents(missing)
+            for text, vector in zip(missing, computed):
+                self._set_cached(text, vector)
+                vectors[text] = vector
+        return [vectors[text] for text in texts]
+
+    def embed_documents(self, texts):
+        """Embebe solo los textos que no están en el almacén persistente y guarda los nuevos."""
+        if self._store is None:
+            with EMBEDDING_SECONDS.time(kind="documents"):
+                return self._embeddings.embed_documents(texts)
+        stored = self._store.get_many(self._namespace, texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in stored))
+        if missing:
+            with EMBEDDING_SECONDS.time(kind="documents"):
+                vectors = self._embeddings.embed_documents(missing)
+            self._store.put_many(self._namespace, missing, vectors)
+            stored.update(zip(missing, vectors))
+        return [stored[text] for text in texts]
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def get_namespace(self):
+        """Identificador del modelo con el que se calcularon los vectores."""
+        return self._namespace
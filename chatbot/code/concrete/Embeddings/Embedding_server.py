@@ -0,0 +1,169 @@
+from abstract.Observer.Observer import Observer
+
+from concrete.Constants_manager import Constants_manager
+from concrete.Embeddings.Embeddings_factory import Embeddings_factory
+
+from utils.embedding_protocol import encode_message, encode_vectors, aread_message
+
+import asyncio
+import fcntl
+import os
+import time
+
+
+class Embedding_server(Observer):
+    """Proceso único dueño del modelo de embeddings, compartido por todos los workers.
+
+    Atiende pedidos por un socket Unix y agrupa dinámicamente los pedidos concurrentes:
+    espera hasta 'max_wait' segundos o hasta juntar 'max_batch_size' textos y los embebe
+    en una sola llamada al modelo. Las llamadas al modelo son secuenciales, de modo que
+    el proceso usa un solo pool de hilos de inferencia."""
+
+    def __init__(self, socket_path, max_batch_size=64, max_wait=0.005):
+        self._socket_path = socket_path
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        # (modelo, backend_id, configuración): se reemplaza entero para que cada batch use un modelo y su id
+        self._model = (None, None, None)
+        self._queue = None
+        self._lock_file = None
+        self._stats = {"requests": 0, "batches": 0, "texts": 0}
+
+    def _get_settings(self, const):
+        return (const.EMBEDDING_NAME, const.EMBEDDING_BACKEND, const.EMBEDDING_THREADS, const.EMBEDDING_BATCH_SIZE)
+
+    async def _load_model(self):
+        """Carga el modelo configurado; mientras tanto el anterior sigue atendiendo con su propio id."""
+        const = Constants_manager.get_instance(Constants_manager)
+        cache_dir = os.path.join(os.getcwd(), const.RESOURCES_PATH, const.EMBEDDING_CACHE_DIR)
+        factory = Embeddings_factory.from_settings(const, cache_dir)
+        settings = self._get_settings(const)
+        print(f"[Embeddings] Cargando {const.EMBEDDING_NAME} ({const.EMBEDDING_BACKEND})...")
+        embeddings = await asyncio.to_thread(factory.create)
+        self._model = (embeddings, factory.get_backend_id(), settings)
+        print(f"[Embeddings] Modelo listo: {self._model[1]}")
+
+    async def notify(self, changes):
+        # Solo un cambio en la configuración del modelo obliga a recargarlo
+        const = Constants_manager.get_instance(Constants_manager)
+        if changes.requires("reembed", "reload_embeddings") and self._get_settings(const) != self._model[2]:
+            await self._load_model()
+
+    def _acquire_lock(self):
+        """Garantiza un único servidor por socket; devuelve False si ya hay uno activo."""
+        self._lock_file = open(f"{self._socket_path}.lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._lock_file.close()
+            return False
+
+    async def serve_forever(self):
+        if not self._acquire_lock():
+            print(f"[Embeddings] Ya hay un servidor escuchando en {self._socket_path}.")
+            return
+        await self._load_model()
+        self._queue = asyncio.Queue()
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self._socket_path)
+        print(f"[Embeddings] Escuchando en {self._socket_path} (batch máximo {self._max_batch_size}, espera {self._max_wait * 1000:.1f}ms)")
+        batcher = asyncio.create_task(self._batch_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+
+    async def _handle(self, reader, writer):
+        """Atiende los pedidos de una conexión hasta que el worker la cierra."""
+        try:
+            while True:
+                try:
+                    header, _ = await aread_message(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                writer.write(await self._respond(header))
+                await writer.drain()
+        except Exception as e:
+            print(f"[Embeddings] Error en la conexión: {type(e).__name__} {e}")
+        finally:
+            writer.close()
+
+    async def _respond(self, header):
+        if header.get("op") == "info":
+            _, backend_id, settings = self._model
+            return encode_message({
+                "backend_id": backend_id,
+                "model": settings[0] if settings else None,
+                "backend": settings[1] if settings else None,
+                "stats": self._stats
+            })
+        try:
+            texts = header["texts"]
+            self._stats["requests"] += 1
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((texts, future))
+            vectors, backend_id = await future
+        except Exception as e:
+            return encode_message({"error": f"{type(e).__name__}: {e}"})
+        dimensions = len(vectors[0]) if vectors else 0
+        # Cada respuesta lleva el id del modelo que calculó sus vectores, no el del modelo activo
+        return encode_message(
+            {"count": len(vectors), "dimensions": dimensions, "backend_id": backend_id},
+            encode_vectors(vectors)
+        )
+
+    async def _next_batch(self):
+        """Junta pedidos hasta llenar el batch o agotar la espera desde el primero."""
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self._max_wait
+        while size < self._max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _batch_loop(self):
+        while True:
+            batch = await self._next_batch()
+            unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            embeddings, backend_id, _ = self._model
+            try:
+                vectors = await asyncio.to_thread(embeddings.embed_documents, unique) if unique else []
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._stats["batches"] += 1
+            self._stats["texts"] += len(unique)
+            computed = dict(zip(unique, vectors))
+            for texts, future in batch:
+                if not future.done():
+                    future.set_result(([computed[text] for text in texts], backend_id))
+
+
+def main():
+    const = Constants_manager()
+    server = Embedding_server(
+        socket_path=const.EMBEDDING_SERVER_SOCKET,
+        max_batch_size=const.EMBEDDING_SERVER_MAX_BATCH,
+        max_wait=const.EMBEDDING_SERVER_MAX_WAIT_MS / 1000
+    )
+    const.add_observer(server)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
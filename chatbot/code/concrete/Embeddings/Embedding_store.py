@@ -0,0 +1,81 @@
+from array import array
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+class Embedding_store:
+    """Almacén persistente de vectores direccionado por contenido, sobre SQLite.
+
+    Cada vector se guarda como BLOB float32 bajo el hash de (modelo, texto), de modo que
+    una reconstrucción solo embebe los fragmentos cuyo texto cambió. Al superar
+    'max_entries' se desalojan los vectores usados hace más tiempo."""
+
+    def __init__(self, path, max_entries=500000):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._connection.commit()
+
+    @staticmethod
+    def _key(namespace, text):
+        return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, namespace, texts):
+        """Devuelve {texto: vector} para los textos ya almacenados."""
+        keys = {self._key(namespace, text): text for text in texts}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            # SQLite limita la cantidad de parámetros por sentencia
+            for i in range(0, len(key_list), 500):
+                batch = key_list[i : i + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, self._key(namespace, text)) for text in found]
+                )
+                self._connection.commit()
+        return found
+
+    def put_many(self, namespace, texts, vectors):
+        now = time.time()
+        rows = [
+            (self._key(namespace, text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        count = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self._max_entries:
+            self._connection.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self._max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,190 @@
+import json
+import os
+import platform
+import re
+import time
+
+class Embeddings_factory:
+    """Crea el modelo de embeddings según el backend configurado: 'torch', 'onnx' u 'onnx-int8'.
+
+    Los backends ONNX solo se aceptan si una verificación de paridad muestra que sus
+    vecinos más cercanos coinciden con los del modelo original en PyTorch; si no, se
+    vuelve a PyTorch. El resultado de la verificación se guarda para no repetirla en
+    cada arranque."""
+
+    BACKENDS = ("torch", "onnx", "onnx-int8")
+    PARITY_FILE = "parity.json"
+    PARITY_K = 3
+
+    # Corpus de verificación: pares de textos sobre el mismo tema
+    PARITY_TEXTS = [
+        "¿Cómo instalo las dependencias del proyecto?",
+        "Para instalar las dependencias ejecuta pip install -r requirements.txt.",
+        "¿Dónde se configuran las variables de entorno?",
+        "Las variables de entorno se definen en el archivo .env del directorio chatbot.",
+        "¿Cómo reinicio el servicio sin cortar las consultas?",
+        "Enviar SIGHUP a gunicorn recarga la configuración sin detener el servidor.",
+        "¿Qué hago si la base de datos vectorial está vacía?",
+        "Si la colección no tiene documentos, se reconstruye desde el repositorio de la wiki.",
+        "¿Cómo se conecta el webhook con GitHub?",
+        "El webhook recibe los eventos push del repositorio y encola una reindexación.",
+        "¿Qué modelo de lenguaje usa el chatbot?",
+        "El chatbot responde con un modelo llama servido localmente por Ollama.",
+        "¿Cuánto tiempo se guarda el historial de una sesión?",
+        "El historial de cada sesión expira tras una hora sin actividad.",
+        "¿Por qué una consulta tarda tanto en responder?",
+        "La latencia depende de la recuperación de documentos y de la generación del modelo.",
+    ]
+
+    def __init__(self, model_name, backend="torch", threads=0, batch_size=32, cache_dir="embeddings", min_recall=0.9):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Backend de embeddings desconocido: {backend}. Opciones: {', '.join(self.BACKENDS)}")
+        self._model_name = model_name
+        self._backend = backend
+        self._threads = threads
+        self._batch_size = batch_size
+        self._cache_dir = cache_dir
+        self._min_recall = min_recall
+
+    @classmethod
+    def from_settings(cls, const, cache_dir):
+        """Construye la fábrica a partir de la configuración del chatbot."""
+        return cls(
+            model_name=const.EMBEDDING_NAME,
+            backend=const.EMBEDDING_BACKEND,
+            threads=const.EMBEDDING_THREADS,
+            batch_size=const.EMBEDDING_BATCH_SIZE,
+            cache_dir=cache_dir,
+            min_recall=const.EMBEDDING_PARITY_MIN_RECALL
+        )
+
+    def get_backend_id(self):
+        if self._backend == "onnx-int8":
+            return f"{self._model_name}|{self._backend}|{self._quantization_config()}"
+        return f"{self._model_name}|{self._backend}"
+
+    def create(self):
+        """Devuelve el modelo del backend configurado, o el de PyTorch si no supera la paridad."""
+        if self._backend == "torch":
+            return self._create_torch()
+        try:
+            embeddings = self._create_onnx(quantized=self._backend == "onnx-int8")
+            if self._check_parity(embeddings):
+                print(f"Embeddings con backend {self._backend}.")
+                return embeddings
+            print(f"El backend {self._backend} no alcanza la paridad requerida, se usa torch.")
+        except Exception as e:
+            print(f"No se pudo cargar el backend {self._backend}, se usa torch: {e}")
+        self._backend = "torch"
+        return self._create_torch()
+
+    def _encode_kwargs(self):
+        return {"batch_size": self._batch_size}
+
+    def _create_torch(self):
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        if self._threads > 0:
+            import torch
+            torch.set_num_threads(self._threads)
+        return HuggingFaceEmbeddings(model_name=self._model_name, encode_kwargs=self._encode_kwargs(), show_progress=True)
+
+    def _session_options(self):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if self._threads > 0:
+            options.intra_op_num_threads = self._threads
+        return options
+
+    def _model_dir(self):
+        return os.path.join(self._cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", self._model_name))
+
+    @staticmethod
+    def _quantization_config():
+        """Elige la configuración de cuantización int8 según las instrucciones del procesador."""
+        if platform.machine().lower() in ("arm64", "aarch64"):
+            return "arm64"
+        flags = ""
+        if os.path.exists("/proc/cpuinfo"):
+            with open("/proc/cpuinfo", "r", encoding="utf-8") as file:
+                flags = file.read()
+        if "avx512_vnni" in flags:
+            return "avx512_vnni"
+        if "avx512f" in flags:
+            return "avx512"
+        return "avx2"
+
+    def _create_onnx(self, quantized):
+        """Exporta el modelo a ONNX (y opcionalmente lo cuantiza a int8) una única vez y lo carga."""
+        from sentence_transformers import SentenceTransformer
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        model_dir = self._model_dir()
+        file_name = "onnx/model.onnx"
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            print(f"Exportando {self._model_name} a ONNX...")
+            SentenceTransformer(self._model_name, backend="onnx", device="cpu").save(model_dir)
+
+        if quantized:
+            config = self._quantization_config()
+            file_name = f"onnx/model_qint8_{config}.onnx"
+            if not os.path.exists(os.path.join(model_dir, file_name)):
+                from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+                print(f"Cuantizando {self._model_name} a int8 ({config})...")
+                model = SentenceTransformer(model_dir, backend="onnx", device="cpu")
+                export_dynamic_quantized_onnx_model(model, config, model_dir)
+
+        return HuggingFaceEmbeddings(
+            model_name=model_dir,
+            model_kwargs={
+                "device": "cpu",
+                "backend": "onnx",
+                "model_kwargs": {
+                    "file_name": file_name,
+                    "provider": "CPUExecutionProvider",
+                    "session_options": self._session_options()
+                }
+            },
+            encode_kwargs=self._encode_kwargs(),
+            show_progress=True
+        )
+
+    def _read_parity(self):
+        path = os.path.join(self._cache_dir, self.PARITY_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write_parity(self, results):
+        path = os.path.join(self._cache_dir, self.PARITY_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        os.replace(tmp_path, path)
+
+    def _neighbours(self, vectors):
+        import numpy as np
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        similarities = vectors @ vectors.T
+        np.fill_diagonal(similarities, -np.inf)
+        return np.argsort(-similarities, axis=1)[:, :self.PARITY_K]
+
+    def _check_parity(self, embeddings):
+        """Compara el recall@k de los vecinos más cercanos contra el modelo original."""
+        results = self._read_parity()
+        cached = results.get(self.get_backend_id())
+        if cached is not None:
+            return cached["recall"] >= self._min_recall
+
+        print(f"Verificando la paridad del backend {self._backend}...")
+        reference = self._create_torch().embed_documents(self.PARITY_TEXTS)
+        candidate = embeddings.embed_documents(self.PARITY_TEXTS)
+        expected, found = self._neighbours(reference), self._neighbours(candidate)
+        recall = sum(len(set(a) & set(b)) / self.PARITY_K for a, b in zip(expected, found)) / len(expected)
+
+        print(f"Recall@{self.PARITY_K} del backend {self._backend}: {recall:.3f} (mínimo {self._min_recall})")
+        results[self.get_backend_id()] = {"recall": recall, "checked_at": time.time()}
+        os.makedirs(self._cache_dir, exist_ok=True)
+        self._write_parity(results)
+        return recall >= self._min_recall
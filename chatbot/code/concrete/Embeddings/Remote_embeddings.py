@@ -0,0 +1,79 @@
+import asyncio
+import socket
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_protocol import encode_message, decode_vectors, read_message
+
+class Remote_embeddings(Embeddings):
+    """Adaptador de embeddings que delega el cálculo en el servidor de embeddings local.
+
+    Se usa en lugar del modelo propio de cada worker: todos los workers comparten el
+    modelo cargado una única vez en el servidor. Cada llamada abre una conexión corta
+    al socket Unix, por lo que el adaptador puede usarse desde varios hilos.
+
+    Con 'backend_id' el adaptador queda fijado a ese modelo: si el servidor responde con
+    vectores de otro modelo (p. ej. mientras recarga el suyo) la llamada falla en lugar de
+    mezclar vectores de dos modelos en el índice o en el almacén."""
+
+    def __init__(self, socket_path, timeout=60, backend_id=None):
+        self._socket_path = socket_path
+        self._timeout = timeout
+        self._backend_id = backend_id
+
+    def _request(self, header):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self._timeout)
+            sock.connect(self._socket_path)
+            sock.sendall(encode_message(header))
+            response, payload = read_message(sock)
+        if "error" in response:
+            raise RuntimeError(f"Error en el servidor de embeddings: {response['error']}")
+        return response, payload
+
+    def get_info(self):
+        response, _ = self._request({"op": "info"})
+        return response
+
+    def wait_until_available(self, timeout, model=None, backend=None):
+        """Espera a que el servidor acepte conexiones (p. ej. mientras carga el modelo) y devuelve su información.
+
+        Con 'model' y 'backend' espera además a que el servidor sirva ese modelo, de modo que
+        tras un cambio de configuración no se use el id del modelo anterior."""
+        deadline = time.monotonic() + timeout
+        delay = 0.1
+        while True:
+            try:
+                info = self.get_info()
+                if (model is None or info.get("model") == model) and (backend is None or info.get("backend") == backend):
+                    return info
+                reason = f"sirve {info.get('backend_id')}, se espera {model} ({backend})"
+            except (FileNotFoundError, ConnectionError, socket.timeout) as e:
+                reason = e
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"El servidor de embeddings no respondió en {self._socket_path}: {reason}")
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+    def get_backend_id(self):
+        return self._backend_id
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        response, payload = self._request({"op": "embed", "texts": list(texts)})
+        if self._backend_id is not None and response.get("backend_id") != self._backend_id:
+            raise RuntimeError(
+                f"El servidor de embeddings respondió con {response.get('backend_id')} y se esperaba {self._backend_id}."
+            )
+        return decode_vectors(payload, response["count"], response["dimensions"])
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embed_query, text)
@@ -4,17 +4,29 @@ from concrete.Constants_manager import Constants_manager
 from concrete.Documents_manager import Documents_manager
 from concrete.Cache_manager import Cache_manager
 from concrete.DB_manager import DB_manager
+from concrete.History_manager import History_manager
 from concrete.LLM_manager import LLM_manager
+from concrete.Update_queue import Update_queue
+
+from utils.metrics import UPDATE_SECONDS, STARTUP_SECONDS
+from utils.stage_timer import Stage_timer
+from utils.tracing import span
 
 import json
 import asyncio
-import os
+import time
 
 class Chatbot(Singleton):
 
 
     def __init__(self):
         self._services = []
+        self._startup_timer = None
+        self._startup_phase = "pending"
+        self._startup_error = None
+        self._startup_elapsed = None
+        self._ready = False
+        self._started = asyncio.Event()
         
         self.docs = Documents_manager()
 
@@ -25,41 +37,154 @@ class Chatbot(Singleton):
         self.cache.set_services_to_wait([self.db])
         self._services.append(self.cache)
 
+        self.history = History_manager()
+        self._services.append(self.history)
+
         self.llm = LLM_manager()
-        self.llm.set_services_to_wait([self.db, self.cache])
+        self.llm.set_services_to_wait([self.db, self.cache, self.history])
         self._services.append(self.llm)
 
+        self.updates = Update_queue(self.update_documents)
+
         const = Constants_manager.get_instance(Constants_manager)
+        # Los observadores se notifican en paralelo; DB_manager reindexa con el repositorio
+        # ya actualizado y los servicios compuestos esperan a sus dependencias.
         const.add_observer(self.docs)
-        const.add_observer(self.db)
+        const.add_observer(self.db, after=[self.docs])
         const.add_observer(self.cache)
+        const.add_observer(self.history)
         const.add_observer(self.llm)
 
     async def start(self):
-        deployed = self._was_deployed()
-        await self.docs.start()
-        await self.init_services()
-        if not deployed:
-            await asyncio.to_thread(self.db.update_vectors)
-        await self.llm.warm_up()
-        await self.cache.clear_cache()
-
-    async def init_services(self):
-        for service in self._services:
-            await service.connect()
-            await service.wait_for_connection()
-
+        """Arranca el chatbot y lo marca como listo al terminar.
 
-    async def chat(self, session_id, message):
-        return await self.llm.get_response(session_id, message)
-
-
-    async def update_documents(self):
-        await asyncio.to_thread(self.docs.update_repo)
-        await asyncio.to_thread(self.db.update_vectors)
-        await self.cache.clear_cache()
-        await asyncio.to_thread(self.llm.start)
-
-    def _was_deployed(self):
-        const = Constants_manager.get_instance(Constants_manager)
-        return os.path.exists(os.path.join(os.getcwd(), const.RESOURCES_PATH))
\ No newline at end of file
+        La sincronización del repositorio corre en paralelo con la conexión de los
+        servicios, que a su vez se conectan en paralelo respetando sus dependencias
+        ('services_to_wait'). Al final se informa la duración de cada fase."""
+        timer = self._startup_timer = Stage_timer(STARTUP_SECONDS)
+        try:
+            self._startup_phase = "connecting"
+
+            services = asyncio.ensure_future(self.init_services(timer))
+
+            async def sync_and_index():
+                # El pull, el diff y la indexación se hacen con el repositorio bloqueado: con
+                # varios workers, uno solo a la vez toca la copia local compartida
+                async with self.docs.repo_lock():
+                    with timer.stage("repo_sync"):
+                        _, new_sha = await self.docs.start()
+                    await services
+
+                    self._startup_phase = "indexing"
+                    with timer.stage("update_vectors"):
+                        # Sin un commit indexado (primer despliegue) se indexa todo; si no, lo que cambió desde él
+                        changes = await asyncio.to_thread(self.docs.get_changes, self.db.get_indexed_commit(), new_sha)
+                        return await asyncio.to_thread(self.db.update_vectors, changes, None, new_sha)
+
+            affected_sources, _ = await asyncio.gather(sync_and_index(), services)
+            with timer.stage("cache_invalidation"):
+                await self.cache.invalidate_sources(affected_sources)
+
+            self._startup_phase = "warming_up"
+            with timer.stage("warm_up"):
+                await self.llm.warm_up()
+        except Exception as e:
+            self._startup_phase = "failed"
+            self._startup_error = f"{type(e).__name__}: {e}"
+            print(f"Error durante el arranque: {self._startup_error}. {timer}")
+            # Libera a las actualizaciones en espera: fallan en lugar de bloquear la cola
+            self._started.set()
+            raise
+        finally:
+            self._startup_elapsed = timer.total()
+        self._startup_phase = "ready"
+        self._ready = True
+        self._started.set()
+        print(f"Arranque completado. {timer}")
+
+    async def init_services(self, timer=None):
+        """Conecta todos los servicios a la vez; cada uno espera solo a sus dependencias."""
+        timer = timer or Stage_timer()
+
+        async def connect(service):
+            with timer.stage(f"connect_{type(service).__name__}"):
+                await service.connect()
+                await service.wait_for_connection()
+
+        await asyncio.gather(*(connect(service) for service in self._services))
+
+
+    def is_ready(self):
+        """El chatbot está listo cuando terminó el arranque y el índice está cargado."""
+        return self._ready and self.db.exists()
+
+
+    def get_startup_status(self):
+        """Fase actual del arranque y duración (ms) de cada fase."""
+        timer = self._startup_timer
+        return {
+            "ready": self.is_ready(),
+            "phase": self._startup_phase,
+            "error": self._startup_error,
+            "phases_ms": {name: round(elapsed, 1) for name, elapsed in timer.timings.items()} if timer else {},
+            "elapsed_ms": round(self._startup_elapsed if self._startup_elapsed is not None else timer.total(), 1) if timer else 0.0
+        }
+
+
+    async def chat(self, session_id, message, timeout=None):
+        return await self.llm.get_response(session_id, message, timeout)
+
+
+    async def chat_stream(self, session_id, message, timeout=None):
+        async for event in self.llm.stream_response(session_id, message, timeout):
+            yield event
+
+
+    async def chat_batch(self, messages):
+        async for event in self.llm.batch_response(messages):
+            yield event
+
+
+    def startup_failed(self):
+        return self._startup_phase == "failed"
+
+    def enqueue_update(self, payload=None):
+        """Encola la actualización de documentos; se ejecuta en segundo plano."""
+        return self.updates.enqueue(payload)
+
+
+    async def get_update_job(self, job_id):
+        return await self.updates.get_job(job_id)
+
+
+    async def update_documents(self, payload=None, job=None):
+        if not self._started.is_set():
+            # Los pushes recibidos durante el arranque se aplican al terminar
+            (job.set_stage if job else print)("Esperando a que termine el arranque")
+            await self._started.wait()
+        if self.startup_failed():
+            raise RuntimeError(f"El arranque del chatbot falló ({self._startup_error}); no se puede actualizar.")
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            with span("chatbot.update_documents"):
+                await self._update_documents(payload, job)
+            status = "done"
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - start, status=status)
+
+    async def _update_documents(self, payload, job):
+        set_stage = job.set_stage if job else print
+        # La cola solo combina los pushes de este worker: el lock evita que otro worker haga
+        # pull o reindexe sobre el mismo repositorio al mismo tiempo
+        set_stage("Esperando el repositorio")
+        async with self.docs.repo_lock():
+            set_stage("Actualizando repositorio")
+            _, new_sha = await asyncio.to_thread(self.docs.update_repo)
+            set_stage("Detectando cambios")
+            # El diff parte del último commit indexado con éxito, no del HEAD previo al pull
+            changes = await asyncio.to_thread(self.docs.get_changes, self.db.get_indexed_commit(), new_sha)
+            set_stage("Actualizando vectores")
+            affected_sources = await asyncio.to_thread(self.db.update_vectors, changes, job.set_progress if job else None, new_sha)
+        set_stage("Invalidando caché")
+        await self.cache.invalidate_sources(affected_sources)
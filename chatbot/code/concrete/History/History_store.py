@@ -0,0 +1,57 @@
+from abc import ABC, abstractmethod
+
+from langchain_core.messages import HumanMessage
+
+from utils.text_utils import estimate_tokens
+
+class History_store(ABC):
+    """Almacén de historiales de conversación acotado por cantidad de mensajes y tokens."""
+
+    def __init__(self, ttl, max_messages, max_tokens):
+        self._ttl = ttl
+        self._max_messages = max_messages
+        self._max_tokens = max_tokens
+
+    def _enabled(self):
+        """Con max_messages en 0 no se guarda historial (un slice [-0:] lo conservaría entero)."""
+        return self._max_messages > 0
+
+    def _apply_window(self, messages):
+        """Conserva los mensajes más recientes que entran en la ventana de mensajes y tokens."""
+        messages = messages[-self._max_messages:] if self._enabled() else []
+        window = []
+        tokens = 0
+        for message in reversed(messages):
+            tokens += estimate_tokens(str(message.content))
+            if tokens > self._max_tokens:
+                break
+            window.append(message)
+        window.reverse()
+        # El historial siempre comienza con una pregunta del usuario
+        while window and not isinstance(window[0], HumanMessage):
+            window.pop(0)
+        return window
+
+    @abstractmethod
+    async def get(self, session_id):
+        """Devuelve la ventana de mensajes de la sesión."""
+        pass
+
+    @abstractmethod
+    async def append(self, session_id, messages):
+        """Agrega mensajes a la sesión y renueva su TTL."""
+        pass
+
+    @abstractmethod
+    async def clear(self, session_id):
+        """Elimina el historial de una sesión."""
+        pass
+
+    @abstractmethod
+    async def clear_all(self):
+        """Elimina todos los historiales."""
+        pass
+
+    async def close(self):
+        """Libera los recursos del almacén."""
+        pass
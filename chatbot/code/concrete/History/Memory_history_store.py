@@ -0,0 +1,48 @@
+from concrete.History.History_store import History_store
+
+from collections import OrderedDict
+import time
+
+class Memory_history_store(History_store):
+    """Historial local al proceso con TTL por sesión y cantidad máxima de sesiones (LRU)."""
+
+    def __init__(self, ttl, max_messages, max_tokens, max_sessions):
+        super().__init__(ttl, max_messages, max_tokens)
+        self._max_sessions = max_sessions
+        self._sessions = OrderedDict()  # {session_id: (expira, [mensajes])}
+
+    def _get_session(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, messages = entry
+        if expires_at < time.monotonic():
+            del self._sessions[session_id]
+            return None
+        return messages
+
+    async def get(self, session_id):
+        if not self._enabled():
+            return []
+        messages = self._get_session(session_id)
+        if messages is None:
+            return []
+        self._sessions[session_id] = (time.monotonic() + self._ttl, messages)
+        self._sessions.move_to_end(session_id)
+        return self._apply_window(messages)
+
+    async def append(self, session_id, messages):
+        if not self._enabled():
+            return
+        history = self._get_session(session_id) or []
+        history = (history + list(messages))[-self._max_messages:]
+        self._sessions[session_id] = (time.monotonic() + self._ttl, history)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self._max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def clear(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    async def clear_all(self):
+        self._sessions.clear()
@@ -0,0 +1,48 @@
+from concrete.History.History_store import History_store
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+import json
+
+class Redis_history_store(History_store):
+    """Historial compartido entre workers, guardado como una lista de Redis por sesión."""
+
+    def __init__(self, client, ttl, max_messages, max_tokens, prefix="chat_history"):
+        super().__init__(ttl, max_messages, max_tokens)
+        self._client = client
+        self._prefix = prefix
+
+    def _key(self, session_id):
+        return f"{self._prefix}:{session_id}"
+
+    async def get(self, session_id):
+        if not self._enabled():
+            return []
+        key = self._key(session_id)
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.lrange(key, -self._max_messages, -1)
+            pipe.expire(key, self._ttl)
+            raw_messages, _ = await pipe.execute()
+        messages = messages_from_dict([json.loads(raw) for raw in raw_messages])
+        return self._apply_window(messages)
+
+    async def append(self, session_id, messages):
+        if not self._enabled():
+            return
+        key = self._key(session_id)
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, *[json.dumps(message, ensure_ascii=False) for message in messages_to_dict(messages)])
+            pipe.ltrim(key, -self._max_messages, -1)
+            pipe.expire(key, self._ttl)
+            await pipe.execute()
+
+    async def clear(self, session_id):
+        await self._client.delete(self._key(session_id))
+
+    async def clear_all(self):
+        keys = [key async for key in self._client.scan_iter(match=f"{self._prefix}:*", count=500)]
+        for i in range(0, len(keys), 500):
+            await self._client.delete(*keys[i : i + 500])
+
+    async def close(self):
+        await self._client.aclose()
@@ -0,0 +1,68 @@
+from abstract.Singleton.Singleton import Singleton
+from abstract.Observer.Observer import Observer
+from abstract.Composite.Service import Service
+
+from concrete.Constants_manager import Constants_manager
+from concrete.History.Memory_history_store import Memory_history_store
+from concrete.History.Redis_history_store import Redis_history_store
+
+from utils.redis_utils import get_redis_url, get_async_redis
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+class History_manager(Singleton, Observer, Service):
+    """Gestiona el historial de las sesiones sobre un almacén intercambiable (Redis o memoria)."""
+
+    def __init__(self):
+        Service.__init__(self)
+
+    async def notify(self, changes):
+        if not changes.requires("reconnect_history"):
+            return
+        await self.disconnect()
+        await self.connect()
+        await self.wait_for_connection()
+
+    async def _connect(self):
+        if self._service is None:
+            const = Constants_manager.get_instance(Constants_manager)
+            if const.HISTORY_BACKEND == "redis":
+                client = get_async_redis(get_redis_url(const.REDIS_HOST, const.REDIS_PORT), const.REDIS_MAX_CONNECTIONS, const.REDIS_TIMEOUT)
+                self._service = Redis_history_store(
+                    client=client,
+                    ttl=const.HISTORY_TTL,
+                    max_messages=const.HISTORY_MAX_MESSAGES,
+                    max_tokens=const.HISTORY_MAX_TOKENS
+                )
+            else:
+                self._service = Memory_history_store(
+                    ttl=const.HISTORY_TTL,
+                    max_messages=const.HISTORY_MAX_MESSAGES,
+                    max_tokens=const.HISTORY_MAX_TOKENS,
+                    max_sessions=const.HISTORY_MAX_SESSIONS
+                )
+            self._connected.set()
+
+    async def _disconnect(self):
+        if self._service:
+            await self._service.close()
+            self._service = None
+
+    async def get_history(self, session_id):
+        try:
+            return await self._service.get(session_id)
+        except Exception as e:
+            print(f"[History] Error al obtener el historial: {e}")
+            return []
+
+    async def add_to_history(self, session_id, question, answer):
+        try:
+            await self._service.append(session_id, [HumanMessage(content=question), AIMessage(content=answer)])
+        except Exception as e:
+            print(f"[History] Error al guardar el historial: {e}")
+
+    async def clear_session_history(self, session_id):
+        await self._service.clear(session_id)
+
+    async def clear_history(self):
+        await self._service.clear_all()
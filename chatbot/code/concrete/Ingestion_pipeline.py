@@ -0,0 +1,153 @@
+from concrete.Documents_manager import chunk_document
+
+from utils.metrics import INGEST_FILES, INGEST_CHUNKS, INGEST_EMBEDDED, INGEST_THROUGHPUT
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import queue
+import threading
+import time
+
+class Ingestion_stats:
+    """Progreso y throughput de una ingesta."""
+
+    def __init__(self, total_files=0):
+        self.total_files = total_files
+        self.files = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.batches = 0
+        self._start = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def throughput(self):
+        elapsed = self.elapsed()
+        return self.embedded / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.files}/{self.total_files} archivos, {self.chunks} fragmentos, "
+                f"{self.embedded} embebidos ({self.throughput():.1f} frag/s, {self.elapsed():.1f}s)")
+
+
+class Ingestion_pipeline:
+    """Ingesta en streaming: carga → fragmentación → embedding → escritura.
+
+    La lectura y fragmentación de archivos se reparte en un pool de procesos, y el
+    embedding de un batch se calcula mientras el anterior se escribe en Chroma. Las
+    colas entre etapas están acotadas, por lo que nunca se mantiene el corpus completo
+    en memoria."""
+
+    # Por debajo de esta cantidad de archivos no compensa levantar el pool de procesos
+    MIN_FILES_FOR_POOL = 8
+
+    def __init__(self, vectorstore, embeddings, get_chunk_id, batch_size, workers, queue_size, on_progress=None, lexical_index=None):
+        self._vectorstore = vectorstore
+        self._embeddings = embeddings
+        self._get_chunk_id = get_chunk_id
+        self._batch_size = batch_size
+        self._workers = max(1, workers)
+        self._queue_size = max(1, queue_size)
+        self._on_progress = on_progress
+        self._lexical_index = lexical_index
+
+    def _chunk_files(self, repo_path, filenames, chunk_size, chunk_overlap):
+        """Genera (archivo, fragmentos) manteniendo acotada la cantidad de archivos en vuelo."""
+        if self._workers == 1 or len(filenames) < self.MIN_FILES_FOR_POOL:
+            for filename in filenames:
+                yield filename, chunk_document(repo_path, filename, chunk_size, chunk_overlap)
+            return
+
+        # El proceso tiene hilos (event loop, ingesta, clientes): un fork podría heredar un
+        # lock tomado y bloquear al hijo. 'forkserver' crea los hijos desde un proceso limpio;
+        # 'chunk_document' es autocontenida y se importa de nuevo en cada hijo
+        context = multiprocessing.get_context("forkserver")
+        with ProcessPoolExecutor(max_workers=self._workers, mp_context=context) as executor:
+            pending = deque()
+            files = iter(filenames)
+            for filename in files:
+                pending.append((filename, executor.submit(chunk_document, repo_path, filename, chunk_size, chunk_overlap)))
+                if len(pending) >= self._workers * 2:
+                    break
+            while pending:
+                filename, future = pending.popleft()
+                next_filename = next(files, None)
+                if next_filename is not None:
+                    pending.append((next_filename, executor.submit(chunk_document, repo_path, next_filename, chunk_size, chunk_overlap)))
+                yield filename, future.result()
+
+    def _batches(self, chunk_groups, chunk_filter, stats):
+        """Agrupa los fragmentos (ya filtrados) en batches de tamaño fijo."""
+        batch = []
+        for filename, chunks in chunk_groups:
+            stats.files += 1
+            stats.chunks += len(chunks)
+            INGEST_FILES.inc()
+            INGEST_CHUNKS.inc(len(chunks))
+            if chunk_filter is not None:
+                chunks = chunk_filter(filename, chunks)
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= self._batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _write(self, write_queue, stats, errors):
+        """Escribe en Chroma los batches ya embebidos."""
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+            if errors:
+                continue
+            batch, vectors = item
+            try:
+                ids = [self._get_chunk_id(chunk) for chunk in batch]
+                metadatas = [chunk.metadata for chunk in batch]
+                documents = [chunk.page_content for chunk in batch]
+                self._vectorstore._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas, documents=documents)
+                if self._lexical_index is not None:
+                    self._lexical_index.add(ids, documents, metadatas)
+                stats.embedded += len(batch)
+                INGEST_EMBEDDED.inc(len(batch))
+                INGEST_THROUGHPUT.set(round(stats.throughput(), 1))
+                stats.batches += 1
+                print(f"Insertado batch {stats.batches}: {stats}")
+                if self._on_progress:
+                    self._on_progress(stats)
+            except Exception as e:
+                errors.append(e)
+
+    def _embed_and_write(self, batches, stats):
+        """Embebe cada batch mientras el hilo escritor persiste el anterior."""
+        write_queue = queue.Queue(maxsize=self._queue_size)
+        errors = []
+        writer = threading.Thread(target=self._write, args=(write_queue, stats, errors), daemon=True)
+        writer.start()
+        try:
+            for batch in batches:
+                if errors:
+                    break
+                vectors = self._embeddings.embed_documents([chunk.page_content for chunk in batch])
+                write_queue.put((batch, vectors))
+        finally:
+            write_queue.put(None)
+            writer.join()
+        if errors:
+            raise errors[0]
+
+    def run(self, repo_path, filenames, chunk_size, chunk_overlap, chunk_filter=None):
+        """Ingresa los archivos indicados.
+
+        chunk_filter(archivo, fragmentos) permite descartar los fragmentos que no
+        necesitan embeberse (por ejemplo, los que ya están indexados)."""
+        filenames = list(filenames)
+        stats = Ingestion_stats(len(filenames))
+        chunk_groups = self._chunk_files(repo_path, filenames, chunk_size, chunk_overlap)
+        self._embed_and_write(self._batches(chunk_groups, chunk_filter, stats), stats)
+        print(f"Ingesta finalizada: {stats}")
+        return stats
@@ -5,64 +5,99 @@ from abstract.Composite.Compound_service import Compound_service
 from concrete.Constants_manager import Constants_manager
 from concrete.DB_manager import DB_manager
 from concrete.Cache_manager import Cache_manager
+from concrete.History_manager import History_manager
+
+from utils.stage_timer import Stage_timer
+from utils.single_flight import Single_flight
+from utils.text_utils import normalize_query
+from utils.context_packer import Context_packer
+from utils.metrics import (
+    STAGE_SECONDS, LLM_IN_FLIGHT, LLM_TTFT_SECONDS, LLM_GENERATION_SECONDS,
+    LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_REJECTIONS
+)
+from utils.sampled_logger import Sampled_logger
+from utils.generation_scheduler import Generation_scheduler, Scheduler_rejected_error
+
+from contextlib import asynccontextmanager
+import time
+import asyncio
+
+import hashlib
 
 from langchain_ollama import ChatOllama
 from langchain.prompts import ChatPromptTemplate
 
 from langchain.chains.history_aware_retriever import create_history_aware_retriever
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains.retrieval import create_retrieval_chain
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
 
 
 class LLM_manager(Singleton, Observer, Compound_service):
 
     def __init__(self, services_to_wait=[]):
         Compound_service.__init__(self, services_to_wait)
-        self._chat_history = {}  # {session_id: [mensajes]}
+        self._in_flight = Single_flight()
 
-    async def notify(self):
-        await self.disconnect()
-        await self.connect()
-        await self.wait_for_connection()
+    async def notify(self, changes):
+        # El retriever resuelve la colección activa en cada consulta: reindexar no requiere reconstruir las cadenas
+        if not changes.requires("rebuild_chains"):
+            return
+        if self._service is None:
+            await self.connect()
+            await self.wait_for_connection()
+            return
+        # Se construyen primero el modelo y las cadenas nuevas y luego se reemplazan en un
+        # solo paso: las peticiones en curso nunca encuentran el servicio desconectado.
+        self._swap(self._build_components())
 
     async def _connect(self):
         if self._service is None:
-            db = DB_manager.get_instance(DB_manager)
-            const = Constants_manager.get_instance(Constants_manager)
+            self._swap(self._build_components())
+            self._connected.set()
 
-            self._service = ChatOllama(
-                model=const.LLM_NAME,
-                temperature=const.TEMPERATURE,
-                max_tokens=const.MAX_TOKENS
-            )
+    def _build_components(self):
+        """Construye el modelo de lenguaje, las cadenas y el planificador con la configuración actual."""
+        db = DB_manager.get_instance(DB_manager)
+        const = Constants_manager.get_instance(Constants_manager)
 
-            self._history_prompt = ChatPromptTemplate.from_messages([
-                ("system", const.HISTORY_PROMPT),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ])
+        service = ChatOllama(
+            model=const.LLM_NAME,
+            temperature=const.TEMPERATURE,
+            max_tokens=const.MAX_TOKENS
+        )
 
-            self._history_aware_retriever = create_history_aware_retriever(
-                llm=self._service,
+        history_prompt = ChatPromptTemplate.from_messages([
+            ("system", const.HISTORY_PROMPT),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}"),
+        ])
+
+        return {
+            "_service": service,
+            "_history_prompt": history_prompt,
+            "_history_aware_retriever": create_history_aware_retriever(
+                llm=service,
                 retriever=db.get_retriever(const.K),
-                prompt=self._history_prompt
-            )
-
-            self._qa_prompt = ChatPromptTemplate.from_messages([
+                prompt=history_prompt
+            ),
+            "_log": Sampled_logger("[LLM]", const.LOG_SAMPLE_RATE),
+            "_context_packer": Context_packer(const.CONTEXT_TOKEN_BUDGET, const.CONTEXT_DEDUP_THRESHOLD),
+            "_scheduler": Generation_scheduler(
+                max_concurrency=const.GENERATION_CONCURRENCY,
+                max_queue=const.GENERATION_QUEUE_SIZE,
+                on_change=lambda active, waiting: LLM_QUEUE_DEPTH.set(waiting)
+            ),
+            "_generation_timeout": const.GENERATION_TIMEOUT,
+            "_qa_prompt": ChatPromptTemplate.from_messages([
                 ("system", const.SYSTEM_PROMPT),
                 ("human", "{input}"),
-            ])
-
-            self._document_chain = create_stuff_documents_chain(self._service, self._qa_prompt)
+            ]),
+        }
 
-            self.rag_chain  = create_retrieval_chain(
-                retriever=self._history_aware_retriever,
-                combine_docs_chain=self._document_chain
-            )
-
-            self._connected.set()
+    def _swap(self, components):
+        """Reemplaza los componentes sin ceder el control al bucle de eventos, de modo que
+        ninguna petición observa una mezcla de la configuración anterior y la nueva."""
+        for name, value in components.items():
+            setattr(self, name, value)
 
 
     async def _disconnect(self):
@@ -71,79 +106,295 @@ class LLM_manager(Singleton, Observer, Compound_service):
             self._retriever = None
             self._prompt = None
             self._qa = None
-            self.chat_history = {}
 
     
     async def warm_up(self):
         print("Calentando LLM...")
-        await self.rag_chain.ainvoke({"input": "", "chat_history": []})
+        retrieved_docs = await self._retrieve_docs("", [])
+        await self._generate("", retrieved_docs, priority=Generation_scheduler.WARMUP)
         print("Calentamiento finalizado.")
 
 
-    async def _retrieve_docs(self, session_id, input):
-        return await self._history_aware_retriever.ainvoke({
-            "input": input,
-            "chat_history": self._get_history(session_id)
-        })
-    
-    async def get_response(self, session_id="default", question=""):
-        """Genera una respuesta asíncrona."""
-        #try:
-        llm_string = self._service.__class__._get_llm_string(self._service)
+    def _get_llm_string(self):
+        """Identifica la configuración que produce una respuesta: modelo, prompt y K.
+
+        Cambiar el prompt particiona la caché en lugar de obligar a vaciarla."""
+        const = Constants_manager.get_instance(Constants_manager)
+        prompt_hash = hashlib.md5(f"{const.SYSTEM_PROMPT}|{const.K}".encode("utf-8")).hexdigest()
+        return f"{self._service.__class__._get_llm_string(self._service)}|{prompt_hash}"
+
+
+    def check_admission(self, priority=Generation_scheduler.INTERACTIVE):
+        """Rechaza de inmediato (Queue_full_error) si la cola de generación no admite la petición."""
+        try:
+            self._scheduler.admit(priority)
+        except Scheduler_rejected_error as e:
+            LLM_REJECTIONS.inc(priority=Generation_scheduler.PRIORITY_NAMES[priority], reason=e.reason)
+            raise
+
+
+    def _deadline(self, priority, timeout):
+        """Plazo de espera en la cola: las interactivas nunca esperan más que GENERATION_TIMEOUT."""
+        if priority == Generation_scheduler.INTERACTIVE:
+            return min(timeout, self._generation_timeout) if timeout else self._generation_timeout
+        return timeout
+
+
+    @asynccontextmanager
+    async def _generation_slot(self, priority, timeout=None):
+        """Reserva un turno del planificador para una llamada al LLM."""
+        scheduler = self._scheduler
+        name = Generation_scheduler.PRIORITY_NAMES[priority]
+        try:
+            waited = await scheduler.acquire(priority, self._deadline(priority, timeout))
+        except Scheduler_rejected_error as e:
+            LLM_REJECTIONS.inc(priority=name, reason=e.reason)
+            raise
+        LLM_QUEUE_WAIT_SECONDS.observe(waited, priority=name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            scheduler.release(time.perf_counter() - start)
+
+
+    async def _retrieve_docs(self, question, chat_history, timeout=None):
+        """Recupera los documentos y los empaqueta dentro del presupuesto de contexto.
+
+        Con historial, la reformulación de la pregunta también usa el LLM y pasa por el planificador."""
+        request = {"input": question, "chat_history": chat_history}
+        if chat_history:
+            async with self._generation_slot(Generation_scheduler.INTERACTIVE, timeout):
+                retrieved_docs = await self._history_aware_retriever.ainvoke(request)
+        else:
+            retrieved_docs = await self._history_aware_retriever.ainvoke(request)
+        return self._context_packer.pack(retrieved_docs)
+
+
+    def _build_messages(self, question, retrieved_docs):
+        return self._qa_prompt.format_messages(
+            input=question,
+            context="\n\n".join([doc.page_content for doc in retrieved_docs])
+        )
 
 
-        retrieved_docs = await self._retrieve_docs(session_id, question.strip())
-        rendered_prompt = self._qa_prompt.format(
-            input=question.strip(),
-            context="\n".join([doc.page_content for doc in retrieved_docs])
-        )
+    async def _generate_tokens(self, question, retrieved_docs, priority=Generation_scheduler.INTERACTIVE, timeout=None):
+        """Transmite los tokens del LLM registrando el tiempo hasta el primer token y el total.
 
-        response = await self._service.ainvoke(rendered_prompt.to_messages())
-        self._add_to_history(session_id, question.strip(), str(response["answer"]).strip())
+        La llamada espera su turno en el planificador según su prioridad y plazo."""
+        async with self._generation_slot(priority, timeout):
+            start = time.perf_counter()
+            first_token = True
+            with LLM_IN_FLIGHT.track():
+                try:
+                    async for chunk in self._service.astream(self._build_messages(question, retrieved_docs)):
+                        if chunk.content:
+                            if first_token:
+                                LLM_TTFT_SECONDS.observe(time.perf_counter() - start)
+                                first_token = False
+                            yield chunk.content
+                finally:
+                    LLM_GENERATION_SECONDS.observe(time.perf_counter() - start)
 
-        sources = list({doc.metadata.get("source") for doc in retrieved_docs})
-        output = {
-            "answer": response.content,
-            "sources": sources
-        }
 
-        rendered_prompt = str(self._qa_prompt.format(input=question.strip()))
-        print("rendered prompt: ", rendered_prompt)
+    async def _generate(self, question, retrieved_docs, priority=Generation_scheduler.INTERACTIVE, timeout=None):
+        """Genera la respuesta con una única invocación al LLM sobre los documentos ya recuperados."""
+        tokens = [token async for token in self._generate_tokens(question, retrieved_docs, priority, timeout)]
+        return "".join(tokens).strip()
+
+
+    def _get_sources(self, retrieved_docs):
+        sources = []
+        for doc in retrieved_docs:
+            source = doc.metadata.get("source")
+            if source and source not in sources:
+                sources.append(source)
+        return sources
+
+
+    async def get_response(self, session_id="default", question="", timeout=None):
+        """Genera una respuesta asíncrona.
+
+        Consulta primero la caché y, ante un fallo, realiza una única recuperación y una
+        única generación, reutilizando los documentos recuperados como fuentes. 'timeout'
+        acota la espera por un turno de generación (Deadline_exceeded_error al vencer)."""
+        db = DB_manager.get_instance(DB_manager)
+        with db.get_embeddings().request_context():
+            return await self._get_response(session_id, question, timeout)
+
 
+    async def _get_response(self, session_id, question, timeout):
+        question = question.strip()
+        timer = Stage_timer(STAGE_SECONDS)
+        llm_string = self._get_llm_string()
         cache = Cache_manager.get_instance(Cache_manager)
-        cached = await cache.get_cached_answer(rendered_prompt, llm_string)
+
+        with timer.stage("cache_lookup"):
+            cached = await cache.get_cached_answer(question, llm_string)
         if cached:
-            print("[Cache] Respuesta obtenida desde la caché.")
+            await self._add_to_history(session_id, question, cached["answer"])
+            self._log.log(f"Respuesta obtenida desde la caché. {timer}")
             return cached
 
-        response = await self.rag_chain.ainvoke({"input": question.strip(), "chat_history": self._get_history(session_id)})
-        self._add_to_history(session_id, question.strip(), str(response["answer"]).strip())
+        history = await self._get_history(session_id)
+        if history:
+            output = await self._answer(question, history, llm_string, timer, timeout)
+        else:
+            # Sin historial la respuesta solo depende de la pregunta: las consultas
+            # idénticas concurrentes comparten una única recuperación y generación.
+            db = DB_manager.get_instance(DB_manager)
+            key = (normalize_query(question), llm_string, db.get_index_version())
+            output = dict(await self._in_flight.run(key, lambda: self._answer(question, history, llm_string, timer, timeout)))
+
+        await self._add_to_history(session_id, question, output["answer"])
+        self._log.log(f"Respuesta generada. {timer}")
+        return output
+
+
+    async def _answer(self, question, history, llm_string, timer, timeout=None):
+        """Recupera, genera y guarda en caché la respuesta a una pregunta."""
+        cache = Cache_manager.get_instance(Cache_manager)
+        with timer.stage("retrieval"):
+            retrieved_docs = await self._retrieve_docs(question, history, timeout)
 
-        context_docs = response.get("context", [])
-        sources = set()
-        for doc in context_docs:
-            if hasattr(doc, "metadata") and "source" in doc.metadata:
-                sources.add(doc.metadata["source"])
+        with timer.stage("generation"):
+            answer = await self._generate(question, retrieved_docs, timeout=timeout)
 
-        output = {"answer": response["answer"], "sources": list(sources)}
-        await cache.set_cached_answer(rendered_prompt, llm_string, output)
+        output = {"answer": answer, "sources": self._get_sources(retrieved_docs)}
+        with timer.stage("cache_update"):
+            await cache.set_cached_answer(question, llm_string, output)
         return output
-        #except Exception as e:
-        #    print(f"Error en la generación de la respuesta: {e}")
-        #    return {"answer": "Error interno en el servidor. Intenta de nuevo más tarde."}
-    
 
-    def _get_history(self, session_id):
-        return self._chat_history.setdefault(session_id, [])
 
-    def _add_to_history(self, session_id, question, answer):
-        history = self._get_history(session_id)
-        history.append(HumanMessage(content=question))
-        history.append(AIMessage(content=answer))
+    async def batch_response(self, questions):
+        """Responde un lote de preguntas independientes (sin historial), emitiendo cada
+        resultado a medida que termina.
+
+        Las preguntas se embeben en un único batch, los aciertos de caché se resuelven
+        juntos y las restantes se recuperan con una única consulta multi-vector; la
+        generación se limita a BATCH_CONCURRENCY llamadas simultáneas al LLM, con menor
+        prioridad que las consultas interactivas."""
+        db = DB_manager.get_instance(DB_manager)
+        with db.get_embeddings().request_context():
+            async for event in self._batch_response(questions):
+                yield event
+
+
+    async def _batch_response(self, questions):
+        const = Constants_manager.get_instance(Constants_manager)
+        db = DB_manager.get_instance(DB_manager)
+        cache = Cache_manager.get_instance(Cache_manager)
+        llm_string = self._get_llm_string()
+
+        # Las preguntas equivalentes se responden una sola vez
+        questions = [question.strip() for question in questions]
+        groups = {}
+        for index, question in enumerate(questions):
+            groups.setdefault(normalize_query(question), []).append(index)
+        unique = [questions[indices[0]] for indices in groups.values()]
+
+        def items(question, **fields):
+            for index in groups[normalize_query(question)]:
+                yield {"type": "item", "index": index, "query": questions[index], **fields}
+
+        await asyncio.to_thread(db.get_embeddings().embed_queries, unique)
+        misses = []
+        for question, cached in zip(unique, await cache.get_cached_answers(unique, llm_string)):
+            if cached is None:
+                misses.append(question)
+            else:
+                for item in items(question, cached=True, **cached):
+                    yield item
+        self._log.log(f"Lote de {len(questions)} preguntas: {len(unique) - len(misses)} desde la caché, {len(misses)} a generar.")
+        if not misses:
+            return
+
+        retrieved = await db.asearch_many(misses, const.K)
+        semaphore = asyncio.Semaphore(const.BATCH_CONCURRENCY)
+
+        async def answer(question, retrieved_docs):
+            try:
+                async with semaphore:
+                    retrieved_docs = self._context_packer.pack(retrieved_docs)
+                    output = {"answer": await self._generate(question, retrieved_docs, Generation_scheduler.BATCH), "sources": self._get_sources(retrieved_docs)}
+                await cache.set_cached_answer(question, llm_string, output)
+                return question, output, None
+            except Exception as e:
+                self._log.error(f"Error al responder una pregunta del lote: {type(e).__name__} {e}")
+                return question, None, str(e)
+
+        tasks = [asyncio.create_task(answer(question, docs)) for question, docs in zip(misses, retrieved)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                question, output, error = await next_done
+                fields = {"error": error} if error else {"cached": False, **output}
+                for item in items(question, **fields):
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+    async def stream_response(self, session_id="default", question="", timeout=None):
+        """Genera una respuesta token a token.
+
+        Emite primero las fuentes, luego cada token generado y, al finalizar, guarda la
+        respuesta completa en la caché y en el historial. Un acierto de caché se emite
+        como un único evento."""
+        db = DB_manager.get_instance(DB_manager)
+        with db.get_embeddings().request_context():
+            async for event in self._stream_response(session_id, question, timeout):
+                yield event
+
+
+    async def _stream_response(self, session_id, question, timeout):
+        question = question.strip()
+        timer = Stage_timer(STAGE_SECONDS)
+        llm_string = self._get_llm_string()
+        cache = Cache_manager.get_instance(Cache_manager)
+
+        with timer.stage("cache_lookup"):
+            cached = await cache.get_cached_answer(question, llm_string)
+        if cached:
+            await self._add_to_history(session_id, question, cached["answer"])
+            self._log.log(f"Respuesta obtenida desde la caché. {timer}")
+            yield {"type": "cached", **cached}
+            return
+
+        with timer.stage("retrieval"):
+            retrieved_docs = await self._retrieve_docs(question, await self._get_history(session_id), timeout)
+
+        sources = self._get_sources(retrieved_docs)
+        yield {"type": "sources", "sources": sources}
+
+        tokens = []
+        with timer.stage("generation"):
+            async for token in self._generate_tokens(question, retrieved_docs, timeout=timeout):
+                tokens.append(token)
+                yield {"type": "token", "content": token}
+
+        answer = "".join(tokens).strip()
+        await self._add_to_history(session_id, question, answer)
+        with timer.stage("cache_update"):
+            await cache.set_cached_answer(question, llm_string, {"answer": answer, "sources": sources})
+
+        self._log.log(f"Respuesta transmitida. {timer}")
+        yield {"type": "end", "answer": answer, "sources": sources}
+
+
+    async def _get_history(self, session_id):
+        history = History_manager.get_instance(History_manager)
+        return await history.get_history(session_id)
+
+    async def _add_to_history(self, session_id, question, answer):
+        history = History_manager.get_instance(History_manager)
+        await history.add_to_history(session_id, question, answer)
 
 
-    def clear_session_history(self, session_id):
-        self._chat_history[session_id] = []
+    async def clear_session_history(self, session_id):
+        history = History_manager.get_instance(History_manager)
+        await history.clear_session_history(session_id)
 
-    def clear_history(self):
-        self._chat_history = {}
\ No newline at end of file
+    async def clear_history(self):
+        history = History_manager.get_instance(History_manager)
+        await history.clear_history()
@@ -0,0 +1,198 @@
+from abstract.Singleton.Singleton import Singleton
+
+from concrete.Constants_manager import Constants_manager
+
+from utils.redis_utils import get_redis_url, get_async_redis
+
+from collections import OrderedDict
+from uuid import uuid4
+import asyncio
+import json
+import time
+
+class Update_job:
+    """Estado de una reindexación encolada desde el webhook."""
+
+    # Intervalo mínimo entre publicaciones del progreso de la ingesta
+    PROGRESS_INTERVAL = 1.0
+
+    def __init__(self, payload=None, on_change=None):
+        self.id = str(uuid4())
+        self._on_change = on_change
+        self._progress_published_at = 0.0
+        self.payload = payload
+        self.status = "queued"
+        self.stage = "en cola"
+        self.progress = None
+        self.pushes = 1
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def merge(self, payload):
+        """Combina un nuevo push con el pendiente: conserva el 'before' más antiguo y el 'after' más reciente."""
+        self.pushes += 1
+        if self.payload is None or payload is None:
+            self.payload = self.payload or payload
+            return
+        self.payload = self.payload.model_copy(update={
+            "after": payload.after,
+            "commits": self.payload.commits + payload.commits
+        })
+        self.changed()
+
+    def changed(self):
+        """Avisa que el estado cambió; puede llamarse desde cualquier hilo."""
+        if self._on_change:
+            self._on_change(self)
+
+    def set_stage(self, stage):
+        print(f"[Update {self.id}] {stage}")
+        self.stage = stage
+        self.changed()
+
+    def set_progress(self, stats):
+        self.progress = {
+            "files": stats.files,
+            "total_files": stats.total_files,
+            "chunks": stats.chunks,
+            "embedded": stats.embedded,
+            "chunks_per_second": round(stats.throughput(), 1)
+        }
+        now = time.monotonic()
+        if now - self._progress_published_at >= self.PROGRESS_INTERVAL:
+            self._progress_published_at = now
+            self.changed()
+
+    def duration(self):
+        if self.started_at is None:
+            return None
+        return round((self.finished_at or time.time()) - self.started_at, 3)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "pushes": self.pushes,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": self.duration()
+        }
+
+
+class Redis_job_store:
+    """Estado de los trabajos en Redis, para que cualquier worker de gunicorn pueda consultarlo."""
+
+    KEY_PREFIX = "update_job:"
+
+    def _get_client(self):
+        const = Constants_manager.get_instance(Constants_manager)
+        return get_async_redis(get_redis_url(const.REDIS_HOST, const.REDIS_PORT), const.REDIS_MAX_CONNECTIONS, const.REDIS_TIMEOUT)
+
+    async def save(self, state):
+        const = Constants_manager.get_instance(Constants_manager)
+        await self._get_client().set(f"{self.KEY_PREFIX}{state['job_id']}", json.dumps(state), ex=const.UPDATE_JOB_TTL)
+
+    async def load(self, job_id):
+        value = await self._get_client().get(f"{self.KEY_PREFIX}{job_id}")
+        return json.loads(value) if value is not None else None
+
+
+class Update_queue(Singleton):
+    """Cola de reindexaciones con un único worker en segundo plano.
+
+    Los pushes que llegan mientras hay un trabajo pendiente se combinan con él, de modo
+    que una ráfaga de pushes produce una sola reindexación. El estado de cada trabajo se
+    publica en Redis: el webhook lo recibe un worker, pero la consulta del estado puede
+    llegar a cualquiera."""
+
+    MAX_JOBS = 100
+
+    def __init__(self, handler=None, store=None):
+        self._handler = handler
+        self._store = store if store is not None else Redis_job_store()
+        self._jobs = OrderedDict()
+        self._pending = None
+        self._wakeup = None
+        self._worker = None
+        self._loop = None
+        self._dirty = OrderedDict()
+        self._publisher = None
+
+    def set_handler(self, handler):
+        self._handler = handler
+
+    def enqueue(self, payload=None):
+        """Encola un push y devuelve el trabajo que lo procesará."""
+        if self._worker is None or self._worker.done():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+        if self._pending is not None:
+            self._pending.merge(payload)
+            return self._pending
+
+        job = Update_job(payload, on_change=self._publish)
+        self._pending = job
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.MAX_JOBS:
+            self._jobs.popitem(last=False)
+        job.changed()
+        self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id):
+        """Estado de un trabajo (dict): el local si lo procesa este worker; si no, el publicado en Redis."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        try:
+            return await self._store.load(job_id)
+        except Exception as e:
+            print(f"No se pudo leer el trabajo {job_id} desde Redis: {type(e).__name__} {e}")
+            return None
+
+    def _publish(self, job):
+        """Marca el trabajo para publicarlo; lo llaman tanto el event loop como los hilos de ingesta."""
+        self._loop.call_soon_threadsafe(self._schedule_publish, job)
+
+    def _schedule_publish(self, job):
+        self._dirty[job.id] = job
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        # Un único publicador que siempre escribe el estado actual: un estado viejo nunca pisa uno nuevo
+        while self._dirty:
+            _, job = self._dirty.popitem(last=False)
+            try:
+                await self._store.save(job.to_dict())
+            except Exception as e:
+                print(f"No se pudo publicar el trabajo {job.id} en Redis: {type(e).__name__} {e}")
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending is not None:
+                job, self._pending = self._pending, None
+                job.status = "running"
+                job.started_at = time.time()
+                job.changed()
+                try:
+                    await self._handler(job.payload, job)
+                    job.status = "done"
+                    job.set_stage("finalizado")
+                except Exception as e:
+                    job.status = "failed"
+                    job.error = str(e)
+                    job.set_stage("error")
+                finally:
+                    job.finished_at = time.time()
+                    job.changed()
@@ -1,12 +1,19 @@
-from utils.aux_classes import QueryRequest, GitHubWebhookData
+from utils.aux_classes import QueryRequest, BatchQueryRequest, GitHubWebhookData
 
 from concrete.Constants_manager import Constants_manager
 from concrete.Facade.Chatbot import Chatbot
 
-from fastapi import FastAPI
-from http.client import HTTPException
+from utils.metrics import REGISTRY, REQUESTS_IN_FLIGHT
+from utils.tracing import setup_tracing, instrument_app
+from utils.generation_scheduler import Scheduler_rejected_error
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from uuid import uuid4
 
+import json
+import asyncio
+
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -14,10 +21,43 @@ const = Constants_manager()
 app = FastAPI()
 chatbot = Chatbot()
 
+if const.OTEL_ENABLED:
+    setup_tracing(const.OTEL_SERVICE_NAME, const.OTEL_EXPORTER_OTLP_ENDPOINT or None)
+    instrument_app(app)
+
+
+startup_task = None
+
 
 @app.on_event("startup")
 async def startup_event():
-    await chatbot.start()
+    # El arranque corre en segundo plano para que /healthz responda de inmediato;
+    # /ready indica cuándo el worker puede recibir consultas.
+    global startup_task
+    startup_task = asyncio.create_task(chatbot.start())
+    startup_task.add_done_callback(on_startup_done)
+
+
+def on_startup_done(task):
+    # Recupera la excepción para que no quede sin observar; el fallo ya lo registró
+    # el chatbot y /healthz pasa a responder 503 para que el orquestador reinicie el worker
+    if not task.cancelled() and task.exception() is not None:
+        print("El arranque falló: /healthz responde 503.")
+
+
+def ensure_ready():
+    if not chatbot.is_ready():
+        raise HTTPException(status_code=503, detail="El chatbot aún se está iniciando.", headers={"Retry-After": "5"})
+
+
+@app.exception_handler(Scheduler_rejected_error)
+async def scheduler_rejected_handler(request, exc: Scheduler_rejected_error):
+    """Cola de generación llena (429) o sin turno antes del plazo (503), con Retry-After."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.get("/")
@@ -25,28 +65,109 @@ async def root():
     return {"message": "Servidor del Chatbot activo 🚀"}
 
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: el proceso atiende peticiones, aunque el arranque no haya terminado; 503 si el arranque falló."""
+    if chatbot.startup_failed():
+        return JSONResponse(status_code=503, content={"status": "failed", "error": chatbot.get_startup_status().get("error")})
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 solo con los servicios conectados y el índice cargado; incluye la duración de cada fase del arranque."""
+    status = chatbot.get_startup_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Contadores de aciertos, fallos y desalojos de la caché local (L1) y semántica (L2)."""
+    return chatbot.cache.get_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas del proceso en formato de texto de Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/query")
 async def query_db(request: QueryRequest):
+    ensure_ready()
     # Verificar si la base de datos vectorial existe
     if not chatbot.db.exists():
         raise HTTPException(status_code=500, detail="La base de datos no existe. Indexa los documentos primero.")
     session_id = request.session_id or str(uuid4())
 
-    chatbot_response = await chatbot.chat(session_id, request.query)
+    with REQUESTS_IN_FLIGHT.track(endpoint="query"):
+        chatbot_response = await chatbot.chat(session_id, request.query, request.timeout)
     chatbot_response["session_id"] = session_id
 
     return chatbot_response
 
 
+@app.post("/query/stream")
+async def query_db_stream(request: QueryRequest):
+    """Transmite la respuesta como NDJSON: fuentes, tokens y un evento final."""
+    ensure_ready()
+    if not chatbot.db.exists():
+        raise HTTPException(status_code=500, detail="La base de datos no existe. Indexa los documentos primero.")
+    session_id = request.session_id or str(uuid4())
+    # Una vez iniciada la transmisión ya no se puede responder 429: se verifica antes
+    chatbot.llm.check_admission()
+
+    async def event_stream():
+        with REQUESTS_IN_FLIGHT.track(endpoint="query_stream"):
+            try:
+                async for event in chatbot.chat_stream(session_id, request.query, request.timeout):
+                    event["session_id"] = session_id
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            except Scheduler_rejected_error as e:
+                yield json.dumps({"type": "error", "detail": str(e), "retry_after": e.retry_after, "session_id": session_id}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/query/batch")
+async def query_db_batch(request: BatchQueryRequest):
+    """Responde un lote de preguntas independientes y transmite cada resultado como NDJSON
+    a medida que termina (con su índice en el lote), seguido de un evento final."""
+    ensure_ready()
+    if not chatbot.db.exists():
+        raise HTTPException(status_code=500, detail="La base de datos no existe. Indexa los documentos primero.")
+    if len(request.queries) > const.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"El lote supera el máximo de {const.BATCH_MAX_QUERIES} preguntas.")
+
+    async def event_stream():
+        with REQUESTS_IN_FLIGHT.track(endpoint="query_batch"):
+            count = 0
+            async for event in chatbot.chat_batch(request.queries):
+                count += 1
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+            yield json.dumps({"type": "end", "count": count}) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
 @app.post(const.WEBHOOK_ROUTE)
 async def update_db(data: GitHubWebhookData):
-    """Maneja los eventos del webhook de GitHub."""
+    """Maneja los eventos del webhook de GitHub encolando una reindexación en segundo plano."""
     if data.ref == "refs/heads/main":
-        print("Cambio detectado en la rama principal. Actualizando...")
-        try:
-            await chatbot.update_documents()
-            return {"status": "success", "message": "Repositorio y vectores actualizados."}
-        except Exception as e:
-            print(f"Error al actualizar: {e}")
-            return {"status": "error", "message": str(e)}, 500
-    return {"status": "ignored", "message": "Evento no relevante."}
\ No newline at end of file
+        print("Cambio detectado en la rama principal. Encolando actualización...")
+        job = chatbot.enqueue_update(data)
+        return JSONResponse(status_code=202, content={
+            "status": "accepted",
+            "message": "Actualización encolada.",
+            "job_id": job.id
+        })
+    return {"status": "ignored", "message": "Evento no relevante."}
+
+
+@app.get(const.WEBHOOK_ROUTE + "/{job_id}")
+async def update_db_status(job_id: str):
+    """Devuelve la etapa, el progreso y la duración de una reindexación."""
+    job = await chatbot.get_update_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de actualización no encontrado.")
+    return job
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del chatbot se importan con 'chatbot/code' como raíz, igual que en el contenedor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from concrete.Constants_manager import Constants_manager, Config_changes
+
+
+@pytest.fixture
+def const(tmp_path, monkeypatch):
+    # Sin .env en el directorio de trabajo: solo valores por defecto
+    monkeypatch.chdir(tmp_path)
+    return Constants_manager()
+
+
+def _changes(const, **before):
+    snapshot = const._snapshot()
+    snapshot.update(before)
+    return const.get_changes(snapshot)
+
+
+def test_every_action_key_is_a_setting(const):
+    settings = const._snapshot()
+    for action, keys in Constants_manager.ACTION_KEYS.items():
+        assert set(keys) <= settings.keys(), action
+
+
+def test_no_changes_is_falsy(const):
+    changes = const.get_changes(const._snapshot())
+    assert not changes
+    assert changes.actions == set()
+
+
+def test_chunk_size_only_reindexes(const):
+    changes = _changes(const, CHUNK_SIZE=const.CHUNK_SIZE + 1)
+    assert changes.keys == {"CHUNK_SIZE"}
+    assert changes.actions == {"reindex"}
+
+
+def test_embedding_model_reembeds_and_clears_cache(const):
+    changes = _changes(const, EMBEDDING_NAME="otro-modelo")
+    assert changes.actions == {"reembed", "clear_cache"}
+    assert changes.requires("reembed")
+    assert not changes.requires("reindex", "sync_repo")
+
+
+def test_redis_host_reconnects_cache_and_history(const):
+    changes = _changes(const, REDIS_HOST="redis://otro")
+    assert changes.actions == {"reconnect_cache", "reconnect_history"}
+
+
+def test_repository_change_syncs_and_reindexes(const):
+    changes = _changes(const, REPO_NAME="otro-repo")
+    assert changes.actions == {"sync_repo", "reindex"}
+
+
+def test_llm_settings_only_rebuild_chains(const):
+    changes = _changes(const, TEMPERATURE=const.TEMPERATURE + 0.1, K=const.K + 1)
+    assert changes.actions == {"rebuild_chains"}
+
+
+def test_keys_read_on_use_require_no_action(const):
+    changes = _changes(const, RRF_K=const.RRF_K + 1)
+    assert changes
+    assert changes.actions == set()
+
+
+def test_config_changes_requires_any_of_the_actions():
+    changes = Config_changes({"CHUNK_SIZE"}, {"reindex"})
+    assert changes.requires("reembed", "reindex")
+    assert not changes.requires("reembed")
+    assert "reindex" in str(changes)
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from utils.generation_scheduler import Generation_scheduler, Queue_full_error, Deadline_exceeded_error
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_evicts_lowest_priority_waiter_when_queue_is_full():
+    async def scenario():
+        scheduler = Generation_scheduler(max_concurrency=1, max_queue=1)
+        await scheduler.acquire(Generation_scheduler.INTERACTIVE)
+        batch = asyncio.create_task(scheduler.acquire(Generation_scheduler.BATCH))
+        await _settle()
+        interactive = asyncio.create_task(scheduler.acquire(Generation_scheduler.INTERACTIVE))
+        await _settle()
+
+        with pytest.raises(Queue_full_error):
+            await batch
+        assert scheduler.get_stats()["waiting"] == 1
+
+        scheduler.release()
+        await interactive
+        assert scheduler.get_stats()["active"] == 1
+        assert scheduler.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_nobody_has_lower_priority():
+    async def scenario():
+        scheduler = Generation_scheduler(max_concurrency=1, max_queue=1)
+        await scheduler.acquire(Generation_scheduler.INTERACTIVE)
+        waiting = asyncio.create_task(scheduler.acquire(Generation_scheduler.INTERACTIVE))
+        await _settle()
+
+        with pytest.raises(Queue_full_error) as error:
+            await scheduler.acquire(Generation_scheduler.BATCH)
+        assert error.value.status_code == 429
+        assert error.value.retry_after >= 1
+
+        scheduler.release()
+        await waiting
+
+    asyncio.run(scenario())
+
+
+def test_deadline_expires_and_turn_goes_to_next_waiter():
+    async def scenario():
+        scheduler = Generation_scheduler(max_concurrency=1, max_queue=2)
+        await scheduler.acquire(Generation_scheduler.INTERACTIVE)
+
+        with pytest.raises(Deadline_exceeded_error) as error:
+            await scheduler.acquire(Generation_scheduler.INTERACTIVE, timeout=0.01)
+        assert error.value.status_code == 503
+        assert scheduler.expired == 1
+        assert scheduler.get_stats()["waiting"] == 0
+
+        next_waiter = asyncio.create_task(scheduler.acquire(Generation_scheduler.BATCH))
+        await _settle()
+        scheduler.release()
+        await next_waiter
+        assert scheduler.get_stats()["active"] == 1
+
+        scheduler.release()
+        assert scheduler.get_stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_served_by_priority():
+    async def scenario():
+        scheduler = Generation_scheduler(max_concurrency=1, max_queue=3)
+        await scheduler.acquire(Generation_scheduler.INTERACTIVE)
+        served = []
+
+        async def wait(priority):
+            await scheduler.acquire(priority)
+            served.append(priority)
+
+        waiters = [asyncio.create_task(wait(priority)) for priority in (
+            Generation_scheduler.WARMUP, Generation_scheduler.BATCH, Generation_scheduler.INTERACTIVE
+        )]
+        await _settle()
+        for _ in waiters:
+            scheduler.release()
+            await _settle()
+        await asyncio.gather(*waiters)
+        assert served == [Generation_scheduler.INTERACTIVE, Generation_scheduler.BATCH, Generation_scheduler.WARMUP]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = Generation_scheduler(max_concurrency=1, max_queue=2)
+        await scheduler.acquire(Generation_scheduler.INTERACTIVE)
+        waiter = asyncio.create_task(scheduler.acquire(Generation_scheduler.INTERACTIVE))
+        await _settle()
+        assert scheduler.get_stats()["waiting"] == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.get_stats()["waiting"] == 0
+
+        scheduler.release()
+        assert scheduler.get_stats()["active"] == 0
+        assert scheduler.expired == 0
+
+    asyncio.run(scenario())
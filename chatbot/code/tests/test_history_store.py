@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core.messages")
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from concrete.History.Memory_history_store import Memory_history_store
+
+
+def _exchange(question, answer):
+    return [HumanMessage(content=question), AIMessage(content=answer)]
+
+
+def test_keeps_last_messages():
+    store = Memory_history_store(ttl=60, max_messages=2, max_tokens=1000, max_sessions=10)
+    asyncio.run(store.append("s", _exchange("hola", "buenas")))
+    asyncio.run(store.append("s", _exchange("chau", "adiós")))
+    assert [message.content for message in asyncio.run(store.get("s"))] == ["chau", "adiós"]
+
+
+def test_zero_max_messages_disables_history():
+    store = Memory_history_store(ttl=60, max_messages=0, max_tokens=1000, max_sessions=10)
+    asyncio.run(store.append("s", _exchange("hola", "buenas")))
+    assert asyncio.run(store.get("s")) == []
+    # Un slice [-0:] conservaría todo: no debe guardarse nada
+    assert "s" not in store._sessions
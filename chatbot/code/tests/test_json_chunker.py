@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip("langchain.text_splitter")
+
+from utils.json_chunker import Json_chunker
+
+
+@pytest.fixture
+def chunker():
+    return Json_chunker(chunk_size=200, chunk_overlap=20)
+
+
+def test_top_level_scalar_list_has_no_prefix(chunker):
+    assert chunker._render([1, 2, 3]) == ["1, 2, 3"]
+
+
+def test_nested_scalar_list_keeps_path(chunker):
+    assert chunker._render({"a": {"b": [1, "", 2]}}) == ["a.b: 1, 2"]
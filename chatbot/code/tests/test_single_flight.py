@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import Single_flight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = Single_flight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "respuesta"
+
+        results = await asyncio.gather(*(flight.run("clave", work) for _ in range(5)))
+        assert results == ["respuesta"] * 5
+        assert calls == 1
+        assert flight.coalesced == 4
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_the_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = Single_flight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return 42
+
+        leader = asyncio.create_task(flight.run("clave", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.run("clave", work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == 42
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    async def scenario():
+        flight = Single_flight()
+
+        async def failing():
+            await asyncio.sleep(0)
+            raise ValueError("falló")
+
+        results = await asyncio.gather(flight.run("clave", failing), flight.run("clave", failing), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+        async def working():
+            return "ok"
+
+        assert await flight.run("clave", working) == "ok"
+
+    asyncio.run(scenario())
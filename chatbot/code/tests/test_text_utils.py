@@ -0,0 +1,13 @@
+import pytest
+
+from utils.text_utils import is_keyword_query
+
+
+@pytest.mark.parametrize("query", ["Cómo configuro el webhook.", "gracias.", "hola:", "¿Qué es esto?"])
+def test_sentences_are_not_keyword_queries(query):
+    assert not is_keyword_query(query)
+
+
+@pytest.mark.parametrize("query", ["config.yaml", "error E-42.", "ver config.yaml:", "CHUNK_SIZE", '"webhook"'])
+def test_identifiers_are_keyword_queries(query):
+    assert is_keyword_query(query)
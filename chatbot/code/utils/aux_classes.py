@@ -4,6 +4,35 @@ from pydantic import BaseModel
 class QueryRequest(BaseModel):
     query: str
     session_id: Optional[str] = None
+    timeout: Optional[float] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+
+class GitHubCommit(BaseModel):
+    id: str | None = None
+    added: list[str] = []
+    removed: list[str] = []
+    modified: list[str] = []
 
 class GitHubWebhookData(BaseModel):
-    ref: str | None = None
\ No newline at end of file
+    ref: str | None = None
+    before: str | None = None
+    after: str | None = None
+    commits: list[GitHubCommit] = []
+
+class DocumentChanges(BaseModel):
+    """Archivos json agregados, modificados, eliminados y renombrados entre dos commits."""
+    added: list[str] = []
+    modified: list[str] = []
+    deleted: list[str] = []
+    renamed: list[tuple[str, str]] = []
+
+    def sources_to_index(self):
+        return self.added + self.modified + [new for _, new in self.renamed]
+
+    def sources_to_remove(self):
+        return self.deleted + [old for old, _ in self.renamed]
+
+    def is_empty(self):
+        return not (self.added or self.modified or self.deleted or self.renamed)
@@ -0,0 +1,105 @@
+from collections import Counter
+import math
+import os
+import pickle
+import threading
+
+from utils.text_utils import tokenize
+
+class Bm25_index:
+    """Índice invertido BM25 en memoria, actualizable de forma incremental y persistible."""
+
+    VERSION = 1
+
+    def __init__(self, k1=1.5, b=0.75):
+        self._k1 = k1
+        self._b = b
+        self._postings = {}   # {término: {id: frecuencia}}
+        self._lengths = {}    # {id: cantidad de términos}
+        self._documents = {}  # {id: (texto, metadatos)}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _remove(self, doc_id):
+        text, _ = self._documents.pop(doc_id)
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def add(self, ids, texts, metadatas):
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._documents:
+                    self._remove(doc_id)
+                terms = Counter(tokenize(text))
+                for term, frequency in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = frequency
+                self._lengths[doc_id] = sum(terms.values())
+                self._total_length += self._lengths[doc_id]
+                self._documents[doc_id] = (text, metadata)
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self._documents:
+                    self._remove(doc_id)
+
+    def search(self, query, k):
+        """Devuelve hasta k pares (id, puntaje) ordenados por puntaje BM25."""
+        with self._lock:
+            count = len(self._documents)
+            if count == 0:
+                return []
+            average_length = self._total_length / count
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = frequency + self._k1 * (1 - self._b + self._b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self._k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def get(self, doc_id):
+        """Devuelve (texto, metadatos) de un documento indexado."""
+        return self._documents.get(doc_id)
+
+    def save(self, path):
+        """Persiste el índice reemplazando el archivo de forma atómica."""
+        with self._lock:
+            state = {
+                "version": self.VERSION,
+                "postings": self._postings,
+                "lengths": self._lengths,
+                "documents": self._documents,
+                "total_length": self._total_length
+            }
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Carga un índice persistido; devuelve None si no existe o es de otra versión."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+        if state.get("version") != cls.VERSION:
+            return None
+        index = cls()
+        index._postings = state["postings"]
+        index._lengths = state["lengths"]
+        index._documents = state["documents"]
+        index._total_length = state["total_length"]
+        return index
@@ -0,0 +1,45 @@
+import time
+
+class Circuit_breaker:
+    """Corta las llamadas a un servicio lento o caído durante un tiempo.
+
+    Tras 'failure_threshold' llamadas fallidas o lentas consecutivas el circuito se abre
+    y las llamadas se omiten durante 'reset_timeout' segundos; luego se permite una
+    llamada de prueba que vuelve a cerrarlo si tiene éxito."""
+
+    def __init__(self, failure_threshold, reset_timeout, slow_call_threshold):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._slow_call_threshold = slow_call_threshold
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self._reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_progress:
+            self._trial_in_progress = True
+            return True
+        return False
+
+    def record(self, elapsed, ok=True):
+        self._trial_in_progress = False
+        if ok and elapsed <= self._slow_call_threshold:
+            self._failures = 0
+            self._opened_at = None
+            return
+        self._failures += 1
+        if self._failures >= self._failure_threshold or self._opened_at is not None:
+            if self._opened_at is None:
+                print(f"[Circuit breaker] Abierto tras {self._failures} llamadas fallidas o lentas.")
+            self._opened_at = time.monotonic()
@@ -0,0 +1,96 @@
+from langchain.schema import Document
+
+from utils.text_utils import estimate_tokens, tokenize
+
+class Context_packer:
+    """Arma el contexto del prompt a partir de los documentos recuperados.
+
+    Fusiona los fragmentos contiguos o solapados de una misma sección, descarta los
+    casi duplicados (similitud de Jaccard sobre sus términos), ordena por puntaje y
+    corta el resultado al presupuesto de tokens."""
+
+    MIN_OVERLAP = 20
+
+    def __init__(self, token_budget, dedup_threshold=0.8):
+        self._token_budget = token_budget
+        self._dedup_threshold = dedup_threshold
+
+    @staticmethod
+    def _heading(doc):
+        """Encabezado que el fragmentador antepuso (los fragmentos antiguos solo tienen 'title')."""
+        return doc.metadata.get("heading", doc.metadata.get("title"))
+
+    def _body(self, doc):
+        """Contenido sin la línea de título que el fragmentador antepone a cada parte."""
+        heading = self._heading(doc)
+        if heading and doc.page_content.startswith(f"{heading}\n"):
+            return doc.page_content[len(heading) + 1:]
+        return doc.page_content
+
+    def _merge_text(self, first, second):
+        """Une dos textos si uno contiene al otro o si el final del primero es el inicio del segundo."""
+        if second in first:
+            return first
+        if first in second:
+            return second
+        for a, b in ((first, second), (second, first)):
+            start = a.find(b[:self.MIN_OVERLAP])
+            while start != -1:
+                if b.startswith(a[start:]):
+                    return a[:start] + b
+                start = a.find(b[:self.MIN_OVERLAP], start + 1)
+        return None
+
+    def _merge(self, docs):
+        """Fusiona los fragmentos solapados de una misma fuente y ruta json."""
+        merged = []
+        for doc, score in docs:
+            key = (doc.metadata.get("source"), doc.metadata.get("json_path"))
+            for i, (other, other_score) in enumerate(merged):
+                if (other.metadata.get("source"), other.metadata.get("json_path")) != key:
+                    continue
+                text = self._merge_text(self._body(other), self._body(doc))
+                if text is not None:
+                    heading = self._heading(other)
+                    content = f"{heading}\n{text}" if heading and other.page_content.startswith(f"{heading}\n") else text
+                    merged[i] = (Document(page_content=content, metadata=other.metadata), max(score, other_score))
+                    break
+            else:
+                merged.append((doc, score))
+        return merged
+
+    def _deduplicate(self, docs):
+        """Descarta los fragmentos casi idénticos a otro de mayor puntaje."""
+        kept = []
+        for doc, score in sorted(docs, key=lambda item: item[1], reverse=True):
+            terms = set(tokenize(doc.page_content))
+            if any(self._similarity(terms, other_terms) >= self._dedup_threshold for _, _, other_terms in kept):
+                continue
+            kept.append((doc, score, terms))
+        return [(doc, score) for doc, score, _ in kept]
+
+    @staticmethod
+    def _similarity(a, b):
+        if not a or not b:
+            return 1.0 if a == b else 0.0
+        return len(a & b) / len(a | b)
+
+    def pack(self, retrieved_docs):
+        """Devuelve los documentos que entran en el presupuesto, ordenados por puntaje."""
+        # Sin puntaje explícito se usa el orden de recuperación
+        docs = [(doc, doc.metadata.get("score", 1 / (rank + 1))) for rank, doc in enumerate(retrieved_docs)]
+        docs = self._deduplicate(self._merge(docs))
+
+        packed = []
+        used = 0
+        for doc, _ in docs:
+            tokens = estimate_tokens(doc.page_content)
+            if used + tokens > self._token_budget:
+                if not packed:
+                    # El mejor fragmento se recorta antes que dejar el contexto vacío
+                    packed.append(Document(page_content=doc.page_content[:self._token_budget * 4], metadata=doc.metadata))
+                    used = self._token_budget
+                continue
+            packed.append(doc)
+            used += tokens
+        return packed
@@ -0,0 +1,54 @@
+"""Mensajes entre los workers y el servidor de embeddings.
+
+Cada mensaje es un encabezado json precedido por su largo (4 bytes, big-endian) y
+seguido de 'payload_bytes' bytes binarios: los vectores como float32 contiguos."""
+
+from array import array
+import json
+import struct
+
+_LENGTH = struct.Struct(">I")
+
+
+def encode_message(header, payload=b""):
+    body = json.dumps({**header, "payload_bytes": len(payload)}, ensure_ascii=False).encode("utf-8")
+    return _LENGTH.pack(len(body)) + body + payload
+
+
+def encode_vectors(vectors):
+    flat = array("f")
+    for vector in vectors:
+        flat.extend(vector)
+    return flat.tobytes()
+
+
+def decode_vectors(payload, count, dimensions):
+    flat = array("f")
+    flat.frombytes(payload)
+    values = flat.tolist()
+    return [values[i * dimensions:(i + 1) * dimensions] for i in range(count)]
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("El servidor de embeddings cerró la conexión.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_message(sock):
+    """Lee un mensaje desde un socket bloqueante; devuelve (encabezado, payload)."""
+    (length,) = _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))
+    header = json.loads(_recv_exactly(sock, length))
+    return header, _recv_exactly(sock, header["payload_bytes"])
+
+
+async def aread_message(reader):
+    """Lee un mensaje desde un StreamReader; devuelve (encabezado, payload)."""
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    header = json.loads(await reader.readexactly(length))
+    return header, await reader.readexactly(header["payload_bytes"])
@@ -0,0 +1,36 @@
+import fcntl
+
+
+class File_lock:
+    """Lock exclusivo entre procesos (y entre hilos) sobre un archivo, con flock.
+
+    Cada adquisición abre su propio descriptor, de modo que dos instancias sobre la misma
+    ruta se excluyen aunque estén en el mismo proceso."""
+
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+
+    def acquire(self, blocking=True):
+        """Adquiere el lock; sin bloqueo devuelve False si otro lo tiene."""
+        file = open(self._path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
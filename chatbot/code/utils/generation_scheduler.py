@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+
+class Scheduler_rejected_error(Exception):
+    """Petición rechazada por el planificador; lleva el código HTTP y el Retry-After sugerido."""
+
+    status_code = 503
+    reason = "rejected"
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Queue_full_error(Scheduler_rejected_error):
+    status_code = 429
+    reason = "queue_full"
+
+
+class Deadline_exceeded_error(Scheduler_rejected_error):
+    status_code = 503
+    reason = "deadline"
+
+
+class Generation_scheduler:
+    """Control de admisión frente al LLM: limita las generaciones simultáneas y mantiene una
+    cola de espera acotada ordenada por prioridad.
+
+    Con la cola llena, una petición de mayor prioridad desplaza a la de menor prioridad
+    que esté esperando; si no hay a quién desplazar, se rechaza de inmediato. Una petición
+    que no obtiene turno antes de su fecha límite se rechaza en lugar de esperar de más."""
+
+    INTERACTIVE = 0
+    BATCH = 1
+    WARMUP = 2
+    PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", WARMUP: "warmup"}
+
+    def __init__(self, max_concurrency, max_queue, on_change=None):
+        self._max_concurrency = max(1, max_concurrency)
+        self._max_queue = max(0, max_queue)
+        self._on_change = on_change
+        self._active = 0
+        self._waiters = []  # heap de [prioridad, orden, future]
+        self._counter = itertools.count()
+        self._average_duration = 1.0
+        self.rejected = 0
+        self.expired = 0
+
+    def _notify(self):
+        if self._on_change:
+            self._on_change(self._active, len(self._waiters))
+
+    def retry_after(self):
+        """Segundos estimados hasta que la cola actual se vacíe."""
+        pending = len(self._waiters) + self._active
+        return max(1, math.ceil(self._average_duration * pending / self._max_concurrency))
+
+    def _lowest_waiter(self):
+        return max(self._waiters, key=lambda waiter: (waiter[0], waiter[1]), default=None)
+
+    def admit(self, priority):
+        """Verifica sin encolar que una petición con esta prioridad sería aceptada."""
+        if self._active < self._max_concurrency or len(self._waiters) < self._max_queue:
+            return
+        lowest = self._lowest_waiter()
+        if lowest is None or lowest[0] <= priority:
+            self.rejected += 1
+            raise Queue_full_error("La cola de generación está llena.", self.retry_after())
+
+    def _evict_for(self, priority):
+        lowest = self._lowest_waiter()
+        self._waiters.remove(lowest)
+        heapq.heapify(self._waiters)
+        self.rejected += 1
+        if not lowest[2].done():
+            lowest[2].set_exception(Queue_full_error("Desplazada por una petición de mayor prioridad.", self.retry_after()))
+
+    async def acquire(self, priority=INTERACTIVE, timeout=None):
+        """Espera un turno de generación con la prioridad y el plazo (en segundos) indicados.
+
+        Devuelve los segundos esperados en la cola; cada turno obtenido debe devolverse
+        con 'release'."""
+        start = time.monotonic()
+        if self._active < self._max_concurrency and not self._waiters:
+            self._active += 1
+            self._notify()
+            return 0.0
+        self.admit(priority)
+        if len(self._waiters) >= self._max_queue:
+            self._evict_for(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = [priority, next(self._counter), future]
+        heapq.heappush(self._waiters, waiter)
+        self._notify()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # El turno llegó justo al vencer el plazo: se cede al siguiente
+                self._handoff()
+            self._discard(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.expired += 1
+            raise Deadline_exceeded_error("No hubo capacidad de generación antes del plazo.", self.retry_after()) from None
+        finally:
+            self._notify()
+        return time.monotonic() - start
+
+    def release(self, duration=None):
+        """Devuelve un turno; 'duration' alimenta la estimación de Retry-After."""
+        if duration is not None:
+            self._average_duration = 0.8 * self._average_duration + 0.2 * duration
+        self._handoff()
+        self._notify()
+
+    def _discard(self, waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+        if not waiter[2].done():
+            waiter[2].cancel()
+
+    def _handoff(self):
+        """Cede el turno al siguiente en la cola o libera la capacidad."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def get_stats(self):
+        return {
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "max_concurrency": self._max_concurrency,
+            "max_queue": self._max_queue,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "average_duration": round(self._average_duration, 3)
+        }
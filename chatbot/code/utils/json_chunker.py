@@ -0,0 +1,148 @@
+import hashlib
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+
+class Json_chunker:
+    """Fragmenta documentos json recorriendo su estructura.
+
+    Cada fragmento es una sección lógica del documento renderizada como líneas
+    'clave: valor' compactas (sin llaves ni indentación), encabezada por el título de su
+    sección y con su ruta json y su título como metadatos. Las secciones pequeñas
+    contiguas se agrupan y el solapamiento solo se aplica a los textos que efectivamente
+    deben partirse. Ningún fragmento, encabezado incluido, supera 'chunk_size'."""
+
+    # Cambia con cualquier cambio en la forma de los fragmentos: los archivos indexados con
+    # otra versión se vuelven a fragmentar
+    VERSION = 3
+    TITLE_KEYS = ("title", "titulo", "título", "name", "nombre", "heading")
+
+    def __init__(self, chunk_size, chunk_overlap):
+        self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
+        self._splitters = {}
+
+    def _splitter(self, size):
+        if size not in self._splitters:
+            self._splitters[size] = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=min(self._chunk_overlap, size // 2))
+        return self._splitters[size]
+
+    def _heading(self, title):
+        """Encabezado de los fragmentos de una sección, acotado para no agotar el presupuesto."""
+        return title[: self._chunk_size // 4] if title else ""
+
+    def _budget(self, heading):
+        """Largo disponible para el texto una vez descontado el encabezado."""
+        return self._chunk_size - (len(heading) + 1 if heading else 0)
+
+    def _get_title(self, node):
+        if isinstance(node, dict):
+            for key in self.TITLE_KEYS:
+                if isinstance(node.get(key), str) and node[key].strip():
+                    return node[key].strip()
+        return None
+
+    def _is_title(self, key, value, title):
+        return key in self.TITLE_KEYS and isinstance(value, str) and value.strip() == title
+
+    def _items(self, node, path):
+        if isinstance(node, dict):
+            return [(str(key), f"{path}.{key}", value) for key, value in node.items()]
+        return [(f"[{i}]", f"{path}[{i}]", value) for i, value in enumerate(node)]
+
+    def _render(self, node, prefix=""):
+        """Renderiza un nodo como líneas 'ruta.relativa: valor'."""
+        if isinstance(node, dict):
+            lines = []
+            for key, value in node.items():
+                lines.extend(self._render(value, f"{prefix}.{key}" if prefix else str(key)))
+            return lines
+        if isinstance(node, list):
+            if all(not isinstance(value, (dict, list)) for value in node):
+                values = ", ".join(str(value) for value in node if value not in (None, ""))
+                if not values:
+                    return []
+                return [f"{prefix}: {values}" if prefix else values]
+            lines = []
+            for i, value in enumerate(node):
+                lines.extend(self._render(value, f"{prefix}[{i}]"))
+            return lines
+        if node is None or node == "":
+            return []
+        return [f"{prefix}: {node}" if prefix else str(node)]
+
+    def _group_section(self, node, path, heading, group):
+        """Sección de hermanos pequeños contiguos, con la ruta y los títulos de esos hermanos."""
+        keys = [key for key, _, _, _ in group]
+        if len(group) == 1:
+            group_path = group[0][1]
+        elif isinstance(node, list):
+            group_path = f"{path}[{keys[0][1:-1]}:{int(keys[-1][1:-1]) + 1}]"
+        else:
+            group_path = f"{path}[{','.join(repr(key) for key in keys)}]"
+        titles = [title for _, _, title, _ in group if title]
+        title = " | ".join(titles) if titles else heading
+        return (group_path, title, heading, "\n".join(text for _, _, _, text in group))
+
+    def _sections(self, node, path, title):
+        """Devuelve las secciones (ruta, título, encabezado, texto) de un nodo."""
+        heading = self._heading(title)
+        budget = self._budget(heading)
+        text = "\n".join(self._render(node))
+        if len(text) <= budget:
+            return [(path, title, heading, text)] if text else []
+
+        if not isinstance(node, (dict, list)):
+            # Texto largo: único caso en el que se parte con solapamiento
+            return [(path, title, heading, part) for part in self._splitter(budget).split_text(text)]
+
+        sections = []
+        group = []  # (clave, ruta, título propio, texto) de los hermanos pendientes de agrupar
+        group_len = 0
+
+        def flush():
+            nonlocal group, group_len
+            if group:
+                sections.append(self._group_section(node, path, heading, group))
+            group, group_len = [], 0
+
+        for key, child_path, child in self._items(node, path):
+            if isinstance(node, dict) and self._is_title(key, child, title):
+                # El título ya encabeza cada fragmento: no forma un fragmento propio
+                continue
+            child_text = "\n".join(self._render(child, key))
+            if not child_text:
+                continue
+            if len(child_text) <= budget:
+                if group_len + len(child_text) + 1 > budget:
+                    flush()
+                group.append((key, child_path, self._get_title(child), child_text))
+                group_len += len(child_text) + 1
+            else:
+                flush()
+                child_title = self._get_title(child) or title
+                if isinstance(child, (dict, list)):
+                    sections.extend(self._sections(child, child_path, child_title))
+                else:
+                    child_heading = self._heading(child_title)
+                    parts = self._splitter(self._budget(child_heading)).split_text(child_text)
+                    sections.extend((child_path, child_title, child_heading, part) for part in parts)
+        flush()
+        return sections
+
+    def split(self, data, metadata):
+        """Fragmenta un documento json y devuelve un Document por sección."""
+        chunks = []
+        for path, title, heading, text in self._sections(data, "$", self._get_title(data)):
+            if heading in text or len(heading) + 1 + len(text) > self._chunk_size:
+                heading = ""
+            content = f"{heading}\n{text}" if heading else text
+            chunks.append(Document(page_content=content, metadata={
+                **metadata,
+                "json_path": path,
+                "title": title or "",
+                "heading": heading,
+                "chunker_version": self.VERSION,
+                "chunk_hash": hashlib.md5(content.encode("utf-8")).hexdigest()
+            }))
+        return chunks
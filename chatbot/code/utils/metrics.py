@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+import threading
+import time
+
+# Límites de los histogramas de latencia, en segundos
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Métrica con etiquetas, expuesta en el formato de texto de Prometheus."""
+
+    type = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"La métrica {self.name} espera las etiquetas {self.labelnames}, recibió {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        """Devuelve (sufijo, etiquetas, valor) de cada serie."""
+        with self._lock:
+            return [("", dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Incrementa el gauge mientras dura el bloque (p. ej. peticiones en curso)."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self._buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self._buckets), 0.0))
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                for bound, count in zip(self._buckets, counts):
+                    samples.append(("_bucket", {**labels, "le": _format_value(bound)}, count))
+                samples.append(("_sum", labels, total))
+                samples.append(("_count", labels, counts[-1]))
+        return samples
+
+
+class Metrics_registry:
+    """Registro de las métricas del proceso."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, description, labelnames=()):
+        return self._register(Counter(name, description, labelnames))
+
+    def gauge(self, name, description, labelnames=()):
+        return self._register(Gauge(name, description, labelnames))
+
+    def histogram(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Registra una función que actualiza métricas justo antes de exportarlas."""
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Metrics_registry()
+
+# Consultas
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("chatbot_requests_in_flight", "Peticiones en curso.", ["endpoint"])
+STAGE_SECONDS = REGISTRY.histogram("chatbot_stage_seconds", "Duración de cada etapa de una consulta.", ["stage"])
+EMBEDDING_SECONDS = REGISTRY.histogram("chatbot_embedding_seconds", "Duración de las llamadas al modelo de embeddings.", ["kind"])
+SEARCH_SECONDS = REGISTRY.histogram("chatbot_search_seconds", "Duración de la búsqueda en cada índice.", ["index"])
+SEARCH_MODE = REGISTRY.counter("chatbot_search_total", "Búsquedas por modo de recuperación.", ["mode"])
+CACHE_LOOKUP_SECONDS = REGISTRY.histogram("chatbot_cache_lookup_seconds", "Duración de las búsquedas en caché.", ["level"])
+CACHE_LOOKUPS = REGISTRY.counter("chatbot_cache_lookups_total", "Búsquedas en caché por nivel y resultado.", ["level", "result"])
+CACHE_HIT_RATIO = REGISTRY.gauge("chatbot_cache_hit_ratio", "Proporción de aciertos de cada nivel de la caché.", ["level"])
+LLM_IN_FLIGHT = REGISTRY.gauge("chatbot_llm_generations_in_flight", "Generaciones del LLM en curso.")
+LLM_TTFT_SECONDS = REGISTRY.histogram("chatbot_llm_time_to_first_token_seconds", "Tiempo hasta el primer token del LLM.")
+LLM_GENERATION_SECONDS = REGISTRY.histogram("chatbot_llm_generation_seconds", "Duración total de la generación del LLM.")
+LLM_QUEUE_DEPTH = REGISTRY.gauge("chatbot_llm_queue_depth", "Generaciones esperando turno en el planificador.")
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram("chatbot_llm_queue_wait_seconds", "Espera en la cola de generación por prioridad.", ["priority"])
+LLM_REJECTIONS = REGISTRY.counter("chatbot_llm_rejections_total", "Generaciones rechazadas por el planificador.", ["priority", "reason"])
+
+# Arranque
+STARTUP_SECONDS = REGISTRY.histogram("chatbot_startup_phase_seconds", "Duración de cada fase del arranque.", ["stage"])
+
+# Ingesta
+INGEST_FILES = REGISTRY.counter("chatbot_ingest_files_total", "Archivos fragmentados.")
+INGEST_CHUNKS = REGISTRY.counter("chatbot_ingest_chunks_total", "Fragmentos generados.")
+INGEST_EMBEDDED = REGISTRY.counter("chatbot_ingest_embedded_total", "Fragmentos embebidos y escritos en Chroma.")
+INGEST_THROUGHPUT = REGISTRY.gauge("chatbot_ingest_chunks_per_second", "Fragmentos embebidos por segundo en la última ingesta.")
+REPO_SYNC_SECONDS = REGISTRY.histogram("chatbot_repo_sync_seconds", "Duración de la sincronización con GitHub.")
+UPDATE_SECONDS = REGISTRY.histogram("chatbot_update_seconds", "Duración de las reindexaciones.", ["status"])
@@ -0,0 +1,35 @@
+from redis import BlockingConnectionPool as Sync_pool, Redis as Sync_redis
+from redis.asyncio import BlockingConnectionPool, Redis
+
+# Pools compartidos por proceso, uno por configuración
+_async_pools = {}
+_sync_pools = {}
+
+
+def get_redis_url(host, port):
+    """Construye la URL de Redis aceptando tanto un host como una URL completa."""
+    if "://" in host:
+        return f"{host}:{port}"
+    return f"redis://{host}:{port}"
+
+
+def get_async_redis(url, max_connections, timeout):
+    """Cliente asíncrono sobre un pool acotado y compartido dentro del proceso."""
+    key = (url, max_connections, timeout)
+    if key not in _async_pools:
+        _async_pools[key] = BlockingConnectionPool.from_url(
+            url, max_connections=max_connections, timeout=timeout,
+            socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+    return Redis(connection_pool=_async_pools[key])
+
+
+def get_sync_redis(url, max_connections, timeout):
+    """Cliente síncrono sobre un pool acotado, para librerías que no aceptan clientes asíncronos."""
+    key = (url, max_connections, timeout)
+    if key not in _sync_pools:
+        _sync_pools[key] = Sync_pool.from_url(
+            url, max_connections=max_connections, timeout=timeout,
+            socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+    return Sync_redis(connection_pool=_sync_pools[key])
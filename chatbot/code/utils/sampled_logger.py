@@ -0,0 +1,16 @@
+import random
+
+class Sampled_logger:
+    """Registro muestreado para el camino caliente: cada mensaje se imprime con probabilidad
+    'sample_rate'; los errores se imprimen siempre."""
+
+    def __init__(self, prefix, sample_rate=0.01):
+        self._prefix = prefix
+        self._sample_rate = sample_rate
+
+    def log(self, message):
+        if self._sample_rate >= 1 or random.random() < self._sample_rate:
+            print(f"{self._prefix} {message}")
+
+    def error(self, message):
+        print(f"{self._prefix} {message}")
@@ -0,0 +1,34 @@
+import asyncio
+
+class Single_flight:
+    """Agrupa las llamadas concurrentes con la misma clave en una única ejecución.
+
+    La primera llamada (líder) lanza la corrutina; todas, líder incluido, esperan su
+    resultado, que no se interrumpe aunque alguna de ellas se cancele."""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        # La corrutina corre en una tarea propia: si el líder se cancela, los seguidores
+        # siguen esperando el mismo resultado en lugar de recibir su cancelación
+        task = asyncio.create_task(factory())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Evita el aviso de excepción no recuperada cuando nadie espera el resultado
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self):
+        return len(self._calls)
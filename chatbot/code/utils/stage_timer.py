@@ -0,0 +1,35 @@
+import time
+from contextlib import contextmanager
+
+from utils.tracing import span
+
+class Stage_timer:
+    """Registra la duración (en milisegundos) de cada etapa de una consulta.
+
+    Si recibe un histograma, cada etapa se observa también en él (en segundos) y se
+    traza como un span."""
+
+    def __init__(self, histogram=None):
+        self._start = time.perf_counter()
+        self._histogram = histogram
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Mide el tiempo del bloque y lo acumula bajo el nombre de la etapa."""
+        start = time.perf_counter()
+        try:
+            with span(f"chatbot.{name}"):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed * 1000
+            if self._histogram is not None:
+                self._histogram.observe(elapsed, stage=name)
+
+    def total(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def __str__(self):
+        stages = " ".join(f"{name}={elapsed:.1f}ms" for name, elapsed in self.timings.items())
+        return f"{stages} total={self.total():.1f}ms"
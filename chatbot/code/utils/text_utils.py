@@ -0,0 +1,45 @@
+import re
+import unicodedata
+
+
+def estimate_tokens(text):
+    """Estimación aproximada de tokens (~4 caracteres por token)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def normalize_query(text):
+    """Normaliza una consulta para comparaciones exactas: minúsculas, espacios y signos finales."""
+    return " ".join(text.lower().split()).strip("¿?¡!.,;: ")
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[_\-./:][a-z0-9]+)*")
+_IDENTIFIER_PATTERN = re.compile(r"[0-9_\-./:]|[a-z][A-Z]|^[A-Z0-9_]{2,}$")
+
+
+def _strip_accents(text):
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Tokeniza para búsqueda léxica conservando identificadores (p. ej. 'e-42', 'config.yaml')
+    y agregando también sus partes."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(_strip_accents(text.lower())):
+        tokens.append(token)
+        parts = re.split(r"[_\-./:]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def is_keyword_query(text, max_terms=4):
+    """Indica si la consulta tiene forma de búsqueda por palabra clave: pocas palabras y
+    al menos un identificador, código de error o nombre de comando."""
+    words = text.strip().strip("¿?¡!").split()
+    if not words or len(words) > max_terms:
+        return False
+    if text.strip().startswith('"') and text.strip().endswith('"'):
+        return True
+    # El punto o los dos puntos al final de una palabra cierran la frase; los internos
+    # ('config.yaml', 'e:42') sí indican un identificador
+    return any(_IDENTIFIER_PATTERN.search(word.strip(",;").rstrip(".:")) for word in words)
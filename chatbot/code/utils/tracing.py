@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+
+# Tracer de OpenTelemetry; None mientras el trazado no esté habilitado
+_tracer = None
+
+
+def setup_tracing(service_name, endpoint=None):
+    """Configura OpenTelemetry con exportación OTLP. Si los paquetes no están disponibles, el trazado queda desactivado."""
+    global _tracer
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        print(f"[Tracing] OpenTelemetry no disponible, trazado desactivado: {e}")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint) if endpoint else OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(service_name)
+    return True
+
+
+def instrument_app(app):
+    """Agrega spans por petición a la aplicación FastAPI si el trazado está habilitado."""
+    if _tracer is None:
+        return
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        FastAPIInstrumentor.instrument_app(app)
+    except ImportError as e:
+        print(f"[Tracing] No se pudo instrumentar FastAPI: {e}")
+
+
+@contextmanager
+def span(name, **attributes):
+    """Abre un span hijo del actual; sin trazado habilitado no hace nada."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            current.set_attribute(key, value)
+        yield current
@@ -9,8 +9,17 @@ warnings.filterwarnings("ignore")
 
 app = FastAPI()
 
+class GitHubCommit(BaseModel):
+    id: str | None = None
+    added: list[str] = []
+    removed: list[str] = []
+    modified: list[str] = []
+
 class GitHubWebhookData(BaseModel):
     ref: str | None = None
+    before: str | None = None
+    after: str | None = None
+    commits: list[GitHubCommit] = []
 
 @app.post("/github-webhook")
 def github_webhook(data: GitHubWebhookData):
@@ -18,8 +27,8 @@ def github_webhook(data: GitHubWebhookData):
     url = CHATBOT_URL+":"+str(CHATBOT_PORT)+WEBHOOK_ROUTE
     response = requests.post(url, json=data.model_dump())
     msg = ""
-    if response.status_code == 200:
-        msg = "Repositorio y vectores actualizados."
+    if response.ok:
+        msg = "Actualización encolada."
         print(msg, response.json())
     else:
         msg = response.text